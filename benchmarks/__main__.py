@@ -0,0 +1,21 @@
+"""Run a benchmark suite.
+
+Usage: python -m benchmarks <suite> [options]
+"""
+import importlib
+import sys
+
+SUITES = ['gap', 'hooks', 'stack', 'url']
+
+
+def main(argv=None):
+	argv = sys.argv[1:] if argv is None else argv
+	if not argv or argv[0] not in SUITES:
+		sys.stderr.write('{0}Suites: {1}\n'.format(__doc__.lstrip(), ', '.join(SUITES)))
+		return 2
+	module = importlib.import_module('benchmarks.bench_' + argv[0])
+	return module.main(argv[1:])
+
+
+if __name__ == '__main__':
+	sys.exit(main())
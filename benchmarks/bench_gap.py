@@ -0,0 +1,127 @@
+"""Throughput of the tea.gap validation pipeline.
+
+Usage: python -m benchmarks.bench_gap [--number N] [--rows N] [--only PREFIX]
+"""
+import argparse
+import json
+import platform
+import sys
+import timeit
+from tea.collections import stack
+from tea import gap
+from tea.gap import ValidationError, field
+from tea.gap.rules import Required, Email, Url, Integer, Min, Max, MinLen, MaxLen, Regex, Same
+
+
+def small_schema():
+	return [
+		field('username', Required, MinLen(3), MaxLen(30)),
+		field('email', Required, Email),
+		field('age', Integer, Min(18)),
+	]
+
+
+def large_schema(size=10):
+	rules = []
+	for i in range(size):
+		rules.append(field('name_%d' % i, Required, MinLen(2), MaxLen(50)))
+		rules.append(field('email_%d' % i, Required, Email))
+		rules.append(field('site_%d' % i, Url))
+		rules.append(field('code_%d' % i, Regex(r'^[A-Z]{3}-\d{4}$')))
+		rules.append(field('count_%d' % i, Integer, Min(0), Max(1000)))
+	rules.append(field('password', Required, MinLen(8)))
+	rules.append(field('confirm', Same('password')))
+	return rules
+
+
+def payload(rule_set, valid=True):
+	data = {}
+	for f in rule_set:
+		name = f.attribute
+		kind = name.rsplit('_', 1)[0]
+		if valid:
+			data[name] = {
+				'username' : 'kyalo', 'email' : 'kyalo@example.com', 'age' : 30,
+				'name' : 'David', 'site' : 'https://example.com/a', 'code' : 'ABC-1234',
+				'count' : 10, 'password' : 'secret-pass', 'confirm' : 'secret-pass',
+			}[kind]
+		else:
+			data[name] = {
+				'username' : '', 'email' : 'kyalo@example', 'age' : 12,
+				'name' : 'D', 'site' : 'example', 'code' : 'abc', 'count' : 5000,
+				'password' : 'short', 'confirm' : 'other',
+			}[kind]
+	return data
+
+
+def cases(rows=1000):
+	"""Yield (name, function, records per call) benchmark cases."""
+	required = Required(name='name')
+
+	def rule_pass():
+		required('value')
+
+	def rule_fail():
+		try:
+			required('')
+		except ValidationError:
+			pass
+
+	messages = stack(name='Name is required.', email='Email is invalid.', age='Too young.')
+	yield 'rule.call.pass', rule_pass, 1
+	yield 'rule.call.fail', rule_fail, 1
+	yield 'error.construct', lambda: ValidationError(messages), 1
+
+	for size, rule_set in (('small', small_schema()), ('large', large_schema())):
+		schema = gap.compile(rule_set)
+		for outcome, valid in (('pass', True), ('fail', False)):
+			data = payload(rule_set, valid)
+			batch = [data] * rows
+			columns = {k : [v] * rows for k, v in data.items()}
+			prefix = '{0}.{1}.'.format(size, outcome)
+			yield prefix + 'validate', lambda r=rule_set, d=data: gap.validate(r, d), 1
+			yield prefix + 'compiled', lambda s=schema, d=data: s.validate(d), 1
+			yield prefix + 'is_valid', lambda s=schema, d=data: s.is_valid(d), 1
+			yield prefix + 'batch.rows', lambda s=schema, b=batch: list(s.validate_many(b)), rows
+			yield prefix + 'batch.columns', lambda s=schema, c=columns: list(s.validate_many(c)), rows
+
+
+def measure(func, number, repeat=3):
+	"""Best time per call in seconds."""
+	return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def run(number=1000, rows=1000, only=None):
+	results = {}
+	for name, func, records in cases(rows):
+		if only and not name.startswith(only):
+			continue
+		seconds = measure(func, max(1, number // records))
+		results[name] = {
+			'usec_per_call' : seconds * 1e6,
+			'usec_per_record' : seconds * 1e6 / records,
+			'records_per_sec' : records / seconds,
+		}
+	return {
+		'suite' : 'tea.gap',
+		'python' : platform.python_version(),
+		'implementation' : platform.python_implementation(),
+		'platform' : platform.platform(),
+		'number' : number,
+		'rows' : rows,
+		'results' : results,
+	}
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--number', type=int, default=1000, help='Records timed per case.')
+	parser.add_argument('--rows', type=int, default=1000, help='Rows per batch.')
+	parser.add_argument('--only', default=None, help='Only run cases starting with this prefix.')
+	args = parser.parse_args(argv)
+	json.dump(run(args.number, args.rows, args.only), sys.stdout, indent=2, sort_keys=True)
+	sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+	main()
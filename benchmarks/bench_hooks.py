@@ -0,0 +1,56 @@
+"""Cost of firing tea.hooks with many listeners.
+
+Usage: python -m benchmarks.bench_hooks [--listeners 1,10,50] [--number N]
+"""
+import argparse
+import json
+import sys
+import timeit
+from tea.hooks import Tasks, Fineries
+
+
+def tasks_fire(listeners, args, number, instrument=False):
+	"""Time in usec of one Tasks.fire() with the given listeners."""
+	tasks = Tasks()
+	for i in range(listeners):
+		tasks.bind('hook', lambda **kwargs: None, *args, level=i % 5)
+	if instrument:
+		tasks.instrument()
+	fire = tasks.fire
+	return timeit.timeit(lambda: fire('hook', a=1, b=2, c=3), number=number) * 1e6 / number
+
+
+def fineries_fire(listeners, number):
+	"""Time in usec of one Fineries.fire() chaining the given listeners."""
+	fineries = Fineries()
+	for i in range(listeners):
+		fineries.bind('hook', lambda value, a: value + a, 'a', level=i % 5)
+	fire = fineries.fire
+	return timeit.timeit(lambda: fire('hook', 0, a=1, b=2), number=number) * 1e6 / number
+
+
+def run(listeners, number):
+	results = {}
+	for count in listeners:
+		results[count] = {
+			'tasks_all_args': tasks_fire(count, (), number),
+			'tasks_instrumented': tasks_fire(count, (), number, instrument=True),
+			'tasks_no_args': tasks_fire(count, (None,), number),
+			'tasks_some_args': tasks_fire(count, ('a', 'c'), number),
+			'fineries': fineries_fire(count, number),
+		}
+	return results
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--listeners', default='1,10,50')
+	parser.add_argument('--number', type=int, default=10000)
+	args = parser.parse_args(argv)
+	listeners = [int(s) for s in args.listeners.split(',')]
+	json.dump(run(listeners, args.number), sys.stdout, indent=2, sort_keys=True)
+	sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,170 @@
+"""Scaling of tea.collections.Stack key operations and Record access.
+
+Usage: python -m benchmarks.bench_stack [--sizes 1000,10000,100000] [--ops N]
+                                        [--bulk-sizes 10000,100000,1000000]
+"""
+import argparse
+import json
+import sys
+import timeit
+from tea.collections import Stack, FrozenStack, record
+
+
+class ListKeyStack(dict):
+	"""The former list backed key tracking of Stack, for comparison."""
+
+	def __init__(self):
+		super(ListKeyStack, self).__init__()
+		self.keystack = []
+
+	def _has_key(self, key):
+		return key in self.keystack
+
+	def __setitem__(self, key, value):
+		if key not in self.keystack:
+			self.keystack.append(key)
+		return super(ListKeyStack, self).__setitem__(key, value)
+
+	def __delitem__(self, key):
+		self.keystack.remove(key)
+		return super(ListKeyStack, self).__delitem__(key)
+
+
+class LoopStack(ListKeyStack):
+	"""The former Stack.__init__ and update(): one __setitem__ per item,
+	each checking the list of keys, so building is quadratic."""
+
+	def __init__(self, *stacks, **kwargs):
+		super(LoopStack, self).__init__()
+		self.update(*stacks, **kwargs)
+
+	def update(self, *stacks, **kwargs):
+		for st in stacks + (kwargs,):
+			if isinstance(st, dict):
+				st = st.items()
+			for key, value in st:
+				self[key] = value
+
+
+# The quadratic loop case is skipped (reported as null) above this size.
+LOOP_MAX_SIZE = 10000
+
+
+def filled(cls, size):
+	st = cls()
+	for i in range(size):
+		st['key_%d' % i] = i
+	return st
+
+
+def scaling(cls, size, ops):
+	"""Per-operation time in usec of ops inserts, lookups and deletes on a
+	stack that already holds size keys."""
+	st = filled(cls, size)
+	new_keys = ['new_%d' % i for i in range(ops)]
+	old_keys = ['key_%d' % (i * size // ops) for i in range(ops)]
+
+	def insert():
+		for key in new_keys:
+			st[key] = None
+
+	def lookup():
+		for key in old_keys:
+			st._has_key(key)
+
+	def delete():
+		for key in new_keys:
+			del st[key]
+
+	results = {}
+	for name, func in (('insert', insert), ('lookup', lookup), ('delete', delete)):
+		results[name] = timeit.timeit(func, number=1) / ops * 1e6
+	return results
+
+
+def records(ops):
+	"""Attribute read latency (usec) and instance size (bytes) of a Stack
+	and a Record holding the same seven fields."""
+	fields = ['attribute', 'rules', 'display_name', 'error_message', 'if_passes', 'if_fails', 'clean']
+	values = dict((name, None) for name in fields)
+	results = {}
+	for name, item in (('stack', Stack(values)), ('record', record('Field', fields)(**values))):
+		seconds = timeit.timeit(lambda: item.display_name, number=ops * 100)
+		size = sys.getsizeof(item)
+		if hasattr(item, '__dict__'):
+			size += sys.getsizeof(item.__dict__)
+		results[name] = {'getattr' : seconds / (ops * 100) * 1e6, 'bytes' : size}
+	return results
+
+
+def layering(sizes, ops):
+	"""Cost (usec) of deriving a version with one changed key from a stack
+	of the given size: Stack copy-and-set vs FrozenStack.set()."""
+	results = {}
+	for size in sizes:
+		items = dict(('key_%d' % i, i) for i in range(size))
+		mutable, frozen = Stack(items), FrozenStack(items)
+		number = max(1, ops // 100)
+
+		def copy():
+			derived = Stack(mutable)
+			derived['key_0'] = None
+
+		results[str(size)] = {
+			'stack_copy' : timeit.timeit(copy, number=number) / number * 1e6,
+			'frozen_set' : timeit.timeit(lambda: frozen.set('key_0', None), number=ops) / ops * 1e6,
+		}
+	return results
+
+
+def bulk(sizes):
+	"""Time (msec) to build and to update a stack from size items, with the
+	former per-item loop and with the bulk paths. The loop is quadratic and
+	only timed up to LOOP_MAX_SIZE items, once per repeat."""
+	results = {}
+	for size in sizes:
+		pairs = [('key_%d' % i, i) for i in range(size)]
+		payload = dict(pairs)
+		number = max(1, 100000 // size)
+		result = results[str(size)] = {}
+		for name, create in (('loop', LoopStack), ('bulk', Stack), ('from_items', Stack.from_items)):
+			if create is LoopStack and size > LOOP_MAX_SIZE:
+				result[name + '.construct'] = None
+				continue
+			runs = 1 if create is LoopStack else number
+			seconds = min(timeit.repeat(lambda: create(pairs), number=runs, repeat=3)) / runs
+			result[name + '.construct'] = seconds * 1e3
+		for name, cls in (('loop', LoopStack), ('bulk', Stack)):
+			if cls is LoopStack and size > LOOP_MAX_SIZE:
+				result[name + '.update'] = None
+				continue
+			runs = 1 if cls is LoopStack else number
+			seconds = min(timeit.repeat(lambda: cls().update(payload), number=runs, repeat=3)) / runs
+			result[name + '.update'] = seconds * 1e3
+	return results
+
+
+def run(sizes=(1000, 10000, 100000), ops=1000, bulk_sizes=(10000, 100000, 1000000)):
+	results = {}
+	for name, cls in (('stack', Stack), ('list_keys', ListKeyStack)):
+		results[name] = {str(size) : scaling(cls, size, ops) for size in sizes}
+	results['records'] = records(ops)
+	results['layering'] = layering(sizes, ops)
+	results['bulk'] = bulk(bulk_sizes)
+	return {'suite' : 'tea.collections.Stack', 'ops' : ops, 'results' : results}
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--sizes', default='1000,10000,100000')
+	parser.add_argument('--ops', type=int, default=1000)
+	parser.add_argument('--bulk-sizes', default='10000,100000,1000000')
+	args = parser.parse_args(argv)
+	sizes = [int(s) for s in args.sizes.split(',')]
+	bulk_sizes = [int(s) for s in args.bulk_sizes.split(',')]
+	json.dump(run(sizes, args.ops, bulk_sizes), sys.stdout, indent=2, sort_keys=True)
+	sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+	main()
@@ -1,10 +1,19 @@
 from .wrapper import wrap, val
 from .misc import NOTHING
-import collections
+import bisect
+import collections.abc
+import keyword
+import math
+import sys
+import threading
+import types
 import warnings
+import weakref
 
 __all__ = [
-	'Stack', 'stack', 'heap', 'Heap', 'un'
+	'Stack', 'stack', 'heap', 'Heap', 'un', 'LRUCache', 'Record', 'record',
+	'FrozenStack', 'ConcurrentStack', 'BloomFilter', 'iter_unique',
+	'to_sequence', 'ensure_iterable', 'IndexedStack'
 ]
 
 class __ALL_ITEMS__(object):
@@ -12,20 +21,24 @@ class __ALL_ITEMS__(object):
 
 
 class Stack(dict):
-	"""docstring for stack"""
+	"""A dict with attribute access and default values.
+
+	Keys keep their insertion order, which dicts maintain natively.
+	"""
 	ALL_ITEMS = __ALL_ITEMS__
-	__keystack__ = None
 	__default__ = None
+	__factory__ = None
 
 	def __init__(self, *args, **kwargs):
 		super(Stack, self).__init__()
-		self.__keystack__ = []
-		args = args + (kwargs,)
-		for arg in args:
-			if isinstance(arg, dict):
-				arg = arg.items()
-			for k, v in arg:
-				self[k] = v
+		self.update(*args, **kwargs)
+
+	@classmethod
+	def from_items(cls, items):
+		"""Create a stack from a mapping or an iterable of (key, value) pairs."""
+		stack = cls()
+		stack.update(items)
+		return stack
 
 	def setdefault(self, key, default=None):
 		if key is not Stack.ALL_ITEMS:
@@ -42,15 +55,31 @@ class Stack(dict):
 			kwargs = {}
 		self.__default__ = (default, update, kwargs)
 
+	def set_factory(self, factory):
+		"""Like defaultdict's default_factory: missing keys are set to factory().
+
+		factory is called as is, without the closure unwrapping and keyword
+		merging of setdefault(Stack.ALL_ITEMS, ...). Pass None to remove it.
+		"""
+		self.__factory__ = factory
+
 	def has_default(self):
-		return True if self.__default__ else False
+		return True if self.__default__ or self.__factory__ else False
 
 	def get_default(self, _k = None, **_kwargs):
+		factory = self.__factory__
+		if factory is not None:
+			value = factory()
+			if _k is not None:
+				self[_k] = value
+			return value
+
 		if not self.__default__:
 			return None
 
 		default, update, kwargs = self.__default__
-		kwargs.update(_kwargs)
+		if _kwargs:
+			kwargs = dict(kwargs, **_kwargs)
 		value = val(default, **kwargs)
 
 		if _k is not None and update:
@@ -59,10 +88,10 @@ class Stack(dict):
 		return value
 
 	def default_replaces_missing(self):
-		return True if self.__default__ and self.__default__[1] else False
+		return True if self.__factory__ or (self.__default__ and self.__default__[1]) else False
 
 	def _has_key(self, key):
-		return key in self.__keystack__
+		return dict.__contains__(self, key)
 
 	def _super_getitem(self, key):
 		return super(Stack, self).__getitem__(key)
@@ -72,6 +101,9 @@ class Stack(dict):
 			return self._super_getitem(key)
 		elif default is not NOTHING:
 			return val(default)
+		elif self.__factory__ is not None:
+			value = self[key] = self.__factory__()
+			return value
 		elif self.has_default():
 			return self.get_default(_k = key)
 		elif not strict:
@@ -94,32 +126,30 @@ class Stack(dict):
 		return value
 
 	def keys(self):
-		return self.__keystack__
+		return list(dict.keys(self))
 
 	def items(self):
-		return [(key, self[key]) for key in self.__keystack__]
+		return list(dict.items(self))
 
 	def values(self):
-		return [self[key] for key in self.__keystack__]
+		return list(dict.values(self))
 
 	def update(self, *stacks, **kwargs):
 		stacks = stacks + (kwargs,)
+		# Insert in bulk unless a subclass needs to see every item.
+		bulk = self.__class__.__setitem__ is dict.__setitem__
 		for st in stacks:
-			for key, value in st.items():
+			if bulk:
+				dict.update(self, st)
+				continue
+			if isinstance(st, collections.abc.Mapping):
+				st = st.items()
+			for key, value in st:
 				self[key] = value
 
 	def __getitem__(self, key):
 		return self._get_or_default(key)
 
-	def __setitem__(self, key, value):
-		if key not in self.__keystack__:
-			self.__keystack__.append(key)
-		return super(Stack, self).__setitem__(key, value)
-
-	def __delitem__(self, key):
-		self.__keystack__.remove(key)
-		return super(Stack, self).__delitem__(key)
-
 	def __getattr__(self, key):
 		return self._get_or_default(key)
 
@@ -144,6 +174,424 @@ class DefaultStack(Stack):
 		self.__default__ = (default, update, kwargs)
 
 
+class FrozenStack(collections.abc.Mapping):
+	"""An immutable, hashable Stack.
+
+	set(), delete() and merge() return new stacks that share all untouched
+	nodes with the original. Items are kept in a hash array mapped trie, so
+	deriving a new version costs O(log n) instead of a full copy. Like
+	Stack, iteration follows insertion order: every key keeps the sequence
+	number it was first set with, and the items are sorted by it (once per
+	version) when iterated.
+	"""
+	__slots__ = ('_root', '_size', '_next', '_hash', '_order')
+
+	def __init__(self, *args, **kwargs):
+		root, size, next_ = _hamt_update(_EMPTY_NODE, 0, 0, args + (kwargs,))
+		object.__setattr__(self, '_root', root)
+		object.__setattr__(self, '_size', size)
+		object.__setattr__(self, '_next', next_)
+		object.__setattr__(self, '_hash', None)
+		object.__setattr__(self, '_order', None)
+
+	@classmethod
+	def _make(cls, root, size, next_):
+		new = cls.__new__(cls)
+		object.__setattr__(new, '_root', root)
+		object.__setattr__(new, '_size', size)
+		object.__setattr__(new, '_next', next_)
+		object.__setattr__(new, '_hash', None)
+		object.__setattr__(new, '_order', None)
+		return new
+
+	def set(self, key, value):
+		"""Return a new stack with key set to value."""
+		root, added = _hamt_assoc(self._root, 0, _hamt_hash(key), key, (self._next, value))
+		if root is self._root:
+			return self
+		return self._make(root, self._size + added, self._next + added)
+
+	def delete(self, key):
+		"""Return a new stack without key. Raises KeyError if it is missing."""
+		root = _hamt_dissoc(self._root, 0, _hamt_hash(key), key)
+		return self._make(_EMPTY_NODE if root is None else root, self._size - 1, self._next)
+
+	def merge(self, *mappings, **kwargs):
+		"""Return a new stack with the items of the given mappings added."""
+		mappings = mappings + (kwargs,)
+		if not self._size and len(mappings) == 2 and not kwargs \
+				and isinstance(mappings[0], FrozenStack):
+			return mappings[0]
+		root, size, next_ = _hamt_update(self._root, self._size, self._next, mappings)
+		if root is self._root:
+			return self
+		return self._make(root, size, next_)
+
+	def _items(self):
+		"""The (key, value) pairs in insertion order."""
+		order = self._order
+		if order is None:
+			pairs = sorted(_hamt_items(self._root), key=_entry_seq)
+			order = tuple([(key, entry[1]) for key, entry in pairs])
+			object.__setattr__(self, '_order', order)
+		return order
+
+	def get(self, key, default=None):
+		entry = _hamt_get(self._root, _hamt_hash(key), key)
+		return default if entry is _MISSING else entry[1]
+
+	def to_stack(self):
+		return Stack(self._items())
+
+	def __getitem__(self, key):
+		entry = _hamt_get(self._root, _hamt_hash(key), key)
+		if entry is _MISSING:
+			raise KeyError(key)
+		return entry[1]
+
+	def __contains__(self, key):
+		return _hamt_get(self._root, _hamt_hash(key), key) is not _MISSING
+
+	def __getattr__(self, key):
+		entry = _hamt_get(self._root, _hamt_hash(key), key)
+		if entry is _MISSING:
+			raise AttributeError("Key {0} not found in stack.".format(key))
+		return entry[1]
+
+	def __setattr__(self, key, value):
+		raise AttributeError("FrozenStack is immutable. Use set() instead.")
+
+	def __delattr__(self, key):
+		raise AttributeError("FrozenStack is immutable. Use delete() instead.")
+
+	def __iter__(self):
+		for key, value in self._items():
+			yield key
+
+	def __len__(self):
+		return self._size
+
+	def items(self):
+		return list(self._items())
+
+	def keys(self):
+		return [key for key, value in self._items()]
+
+	def values(self):
+		return [value for key, value in self._items()]
+
+	def __eq__(self, other):
+		if self is other:
+			return True
+		if not isinstance(other, collections.abc.Mapping) or len(other) != self._size:
+			return False
+		return dict(self._items()) == dict(other.items())
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __hash__(self):
+		if self._hash is None:
+			object.__setattr__(self, '_hash', hash(frozenset(self._items())))
+		return self._hash
+
+	def __reduce__(self):
+		return (self.__class__, (dict(self._items()),))
+
+	def __repr__(self):
+		return '{0}({1!r})'.format(self.__class__.__name__, dict(self._items()))
+
+
+class ConcurrentStack(collections.abc.MutableMapping):
+	"""A thread safe stack for read-mostly registries.
+
+	Reads never lock: they go to the current snapshot, a dict that is never
+	modified once published. Writes are serialised by a lock, copy the
+	snapshot, change the copy and publish it with a single assignment.
+	"""
+	__slots__ = ('_data', '_lock')
+
+	def __init__(self, *args, **kwargs):
+		object.__setattr__(self, '_data', {})
+		object.__setattr__(self, '_lock', threading.RLock())
+		self.update(*args, **kwargs)
+
+	def snapshot(self):
+		"""A read-only view of the items at this point in time."""
+		return types.MappingProxyType(self._data)
+
+	def to_stack(self):
+		return Stack(self._data)
+
+	def get(self, key, default=None):
+		return self._data.get(key, default)
+
+	def keys(self):
+		return list(self._data)
+
+	def items(self):
+		return list(self._data.items())
+
+	def values(self):
+		return list(self._data.values())
+
+	def update(self, *args, **kwargs):
+		with self._lock:
+			data = dict(self._data)
+			for arg in args + (kwargs,):
+				data.update(arg)
+			self._publish(data)
+
+	def setdefault(self, key, default=None):
+		data = self._data
+		if key in data:
+			return data[key]
+		with self._lock:
+			if key not in self._data:
+				data = dict(self._data)
+				data[key] = default
+				self._publish(data)
+			return self._data[key]
+
+	def pop(self, key, *default):
+		with self._lock:
+			if key not in self._data:
+				if default:
+					return default[0]
+				raise KeyError(key)
+			data = dict(self._data)
+			value = data.pop(key)
+			self._publish(data)
+			return value
+
+	def clear(self):
+		with self._lock:
+			self._publish({})
+
+	def _publish(self, data):
+		object.__setattr__(self, '_data', data)
+
+	def __getitem__(self, key):
+		return self._data[key]
+
+	def __setitem__(self, key, value):
+		with self._lock:
+			data = dict(self._data)
+			data[key] = value
+			self._publish(data)
+
+	def __delitem__(self, key):
+		with self._lock:
+			data = dict(self._data)
+			del data[key]
+			self._publish(data)
+
+	def __contains__(self, key):
+		return key in self._data
+
+	def __iter__(self):
+		return iter(self._data)
+
+	def __len__(self):
+		return len(self._data)
+
+	def __getattr__(self, key):
+		try:
+			return self._data[key]
+		except KeyError:
+			raise AttributeError("Key {0} not found in stack.".format(key))
+
+	def __setattr__(self, key, value):
+		self[key] = value
+
+	def __delattr__(self, key):
+		try:
+			del self[key]
+		except KeyError:
+			raise AttributeError("Key {0} not found in stack.".format(key))
+
+	def __reduce__(self):
+		return (self.__class__, (self._data,))
+
+	def __repr__(self):
+		return '{0}({1!r})'.format(self.__class__.__name__, self._data)
+
+
+class _HamtNode(object):
+	"""A bitmap indexed trie node. Entries are (hash, key, value) tuples or
+	sub nodes. The values are (seq, value) pairs, seq being the insertion
+	sequence number of the key."""
+	__slots__ = ('bitmap', 'array')
+
+	def __init__(self, bitmap, array):
+		self.bitmap = bitmap
+		self.array = array
+
+
+class _HamtCollision(object):
+	"""Holds the (key, value) pairs of keys whose hashes are all equal."""
+	__slots__ = ('hash', 'pairs')
+
+	def __init__(self, hash, pairs):
+		self.hash = hash
+		self.pairs = pairs
+
+
+class _MISSING(object):
+	pass
+
+
+_HAMT_BITS = 5
+_HAMT_MASK = (1 << _HAMT_BITS) - 1
+_HAMT_HASH_BITS = 64
+_EMPTY_NODE = _HamtNode(0, ())
+
+
+def _hamt_hash(key):
+	return hash(key) & 0xFFFFFFFFFFFFFFFF
+
+
+def _hamt_index(bitmap, bit):
+	return bin(bitmap & (bit - 1)).count('1')
+
+
+def _hamt_get(node, h, key):
+	shift = 0
+	while True:
+		if type(node) is _HamtCollision:
+			if node.hash == h:
+				for k, v in node.pairs:
+					if k is key or k == key:
+						return v
+			return _MISSING
+		bit = 1 << ((h >> shift) & _HAMT_MASK)
+		if not node.bitmap & bit:
+			return _MISSING
+		entry = node.array[_hamt_index(node.bitmap, bit)]
+		if type(entry) is tuple:
+			if entry[0] == h and (entry[1] is key or entry[1] == key):
+				return entry[2]
+			return _MISSING
+		node = entry
+		shift += _HAMT_BITS
+
+
+def _hamt_assoc(node, shift, h, key, entry):
+	"""Return (node, added) with key set to the (seq, value) entry in a copy
+	of node. A key that is already present keeps its seq."""
+	if type(node) is _HamtCollision:
+		if node.hash != h:
+			bit = 1 << ((node.hash >> shift) & _HAMT_MASK)
+			return _hamt_assoc(_HamtNode(bit, (node,)), shift, h, key, entry)
+		pairs = list(node.pairs)
+		for i, (k, v) in enumerate(pairs):
+			if k is key or k == key:
+				if v[1] is entry[1]:
+					return node, 0
+				pairs[i] = (key, (v[0], entry[1]))
+				return _HamtCollision(h, tuple(pairs)), 0
+		return _HamtCollision(h, node.pairs + ((key, entry),)), 1
+
+	bit = 1 << ((h >> shift) & _HAMT_MASK)
+	index = _hamt_index(node.bitmap, bit)
+	array = node.array
+	if not node.bitmap & bit:
+		array = array[:index] + ((h, key, entry),) + array[index:]
+		return _HamtNode(node.bitmap | bit, array), 1
+
+	current = array[index]
+	if type(current) is tuple:
+		if current[0] == h and (current[1] is key or current[1] == key):
+			if current[2][1] is entry[1]:
+				return node, 0
+			sub, added = (h, key, (current[2][0], entry[1])), 0
+		else:
+			sub, added = _hamt_pair(shift + _HAMT_BITS, current, (h, key, entry)), 1
+	else:
+		sub, added = _hamt_assoc(current, shift + _HAMT_BITS, h, key, entry)
+		if sub is current:
+			return node, 0
+	return _HamtNode(node.bitmap, array[:index] + (sub,) + array[index + 1:]), added
+
+
+def _hamt_pair(shift, first, second):
+	if first[0] == second[0] or shift >= _HAMT_HASH_BITS:
+		return _HamtCollision(first[0], (first[1:], second[1:]))
+	bit1 = 1 << ((first[0] >> shift) & _HAMT_MASK)
+	bit2 = 1 << ((second[0] >> shift) & _HAMT_MASK)
+	if bit1 == bit2:
+		return _HamtNode(bit1, (_hamt_pair(shift + _HAMT_BITS, first, second),))
+	array = (first, second) if bit1 < bit2 else (second, first)
+	return _HamtNode(bit1 | bit2, array)
+
+
+def _hamt_dissoc(node, shift, h, key):
+	"""Return a copy of node without key, a lone remaining entry or None
+	when the node would be empty."""
+	if type(node) is _HamtCollision:
+		if node.hash == h:
+			pairs = tuple(p for p in node.pairs if not (p[0] is key or p[0] == key))
+			if len(pairs) < len(node.pairs):
+				if len(pairs) == 1:
+					return (h,) + pairs[0]
+				return _HamtCollision(h, pairs)
+		raise KeyError(key)
+
+	bit = 1 << ((h >> shift) & _HAMT_MASK)
+	if not node.bitmap & bit:
+		raise KeyError(key)
+	index = _hamt_index(node.bitmap, bit)
+	entry = node.array[index]
+	if type(entry) is tuple:
+		if not (entry[0] == h and (entry[1] is key or entry[1] == key)):
+			raise KeyError(key)
+		sub = None
+	else:
+		sub = _hamt_dissoc(entry, shift + _HAMT_BITS, h, key)
+
+	if sub is not None:
+		array = node.array[:index] + (sub,) + node.array[index + 1:]
+		bitmap = node.bitmap
+	else:
+		array = node.array[:index] + node.array[index + 1:]
+		bitmap = node.bitmap ^ bit
+
+	if not array:
+		return None
+	# Collapse single leaf nodes into their parent.
+	if shift and len(array) == 1 and type(array[0]) is tuple:
+		return array[0]
+	return _HamtNode(bitmap, array)
+
+
+def _hamt_update(root, size, next_, mappings):
+	for mapping in mappings:
+		if isinstance(mapping, collections.abc.Mapping):
+			mapping = mapping.items()
+		for key, value in mapping:
+			root, added = _hamt_assoc(root, 0, _hamt_hash(key), key, (next_, value))
+			size += added
+			next_ += added
+	return root, size, next_
+
+
+def _entry_seq(item):
+	return item[1][0]
+
+
+def _hamt_items(node):
+	if type(node) is _HamtCollision:
+		for pair in node.pairs:
+			yield pair
+		return
+	for entry in node.array:
+		if type(entry) is tuple:
+			yield entry[1], entry[2]
+		else:
+			for pair in _hamt_items(entry):
+				yield pair
+
+
 class Heap(dict):
 	"""docstring for Heap"""
 	def __init__(self, *args, **kwargs):
@@ -151,34 +599,552 @@ class Heap(dict):
 		self.__dict__ = self
 
 
+class Record(object):
+	"""A compact, slotted record with both attribute and item access.
+
+	Subclasses are created with record() and can only hold the fields they
+	declare. Fields that are not given default to the record's defaults or
+	to None.
+	"""
+	__slots__ = ()
+	__defaults__ = {}
+
+	def __init__(self, *args, **kwargs):
+		fields = self.__slots__
+		if len(args) > len(fields):
+			error = "{0} takes at most {1} positional arguments ({2} given)."
+			raise TypeError(error.format(self.__class__.__name__, len(fields), len(args)))
+
+		for name, value in zip(fields, args):
+			setattr(self, name, value)
+		defaults = self.__defaults__
+		for name in fields[len(args):]:
+			setattr(self, name, kwargs.pop(name, defaults.get(name)))
+
+		if kwargs:
+			error = "{0} has no field(s) {1}."
+			raise TypeError(error.format(self.__class__.__name__, ', '.join(kwargs)))
+
+	def get(self, key, default=None):
+		return getattr(self, key) if key in self.__slots__ else default
+
+	def keys(self):
+		return list(self.__slots__)
+
+	def values(self):
+		return [getattr(self, name) for name in self.__slots__]
+
+	def items(self):
+		return [(name, getattr(self, name)) for name in self.__slots__]
+
+	def to_dict(self):
+		return Stack(self.items())
+
+	def __getitem__(self, key):
+		if key not in self.__slots__:
+			raise KeyError(key)
+		return getattr(self, key)
+
+	def __setitem__(self, key, value):
+		if key not in self.__slots__:
+			raise KeyError(key)
+		setattr(self, key, value)
+
+	def __contains__(self, key):
+		return key in self.__slots__
+
+	def __iter__(self):
+		return iter(self.__slots__)
+
+	def __len__(self):
+		return len(self.__slots__)
+
+	def __eq__(self, other):
+		return type(self) is type(other) and self.values() == other.values()
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	__hash__ = None
+
+	def __repr__(self):
+		values = ', '.join('{0}={1!r}'.format(k, v) for k, v in self.items())
+		return '{0}({1})'.format(self.__class__.__name__, values)
+
+
+class IndexedStack(collections.abc.MutableMapping):
+	"""An ordered mapping with secondary indexes over its values.
+
+	hashed and ordered name the indexes to maintain. Each entry is either
+	an attribute/key name looked up on the values or a (name, func) pair.
+	Hashed indexes answer find() in O(1) and ordered indexes also answer
+	find_range() in O(log n). Results keep insertion order (ordered indexes
+	by index value first).
+
+	Indexes are updated when items are set or removed. Call reindex() after
+	changing an indexed attribute of a stored value in place.
+	"""
+
+	def __init__(self, items=None, hashed=(), ordered=(), **kwargs):
+		self._data = {}
+		self._seq = {}
+		self._fields = {}
+		self._counter = 0
+		self._getters = {}
+		self._hashed = {}
+		self._ordered = {}
+		for spec in hashed:
+			name = self._add_getter(spec)
+			self._hashed[name] = {}
+		for spec in ordered:
+			name = self._add_getter(spec)
+			self._ordered[name] = []
+		self.update(items or (), **kwargs)
+
+	def _add_getter(self, spec):
+		if isinstance(spec, str):
+			name, func = spec, _attr_getter(spec)
+		else:
+			name, func = spec
+		if name in self._getters:
+			raise ValueError("Duplicate index '{0}'.".format(name))
+		self._getters[name] = func
+		return name
+
+	@property
+	def indexes(self):
+		return list(self._getters)
+
+	def find(self, index, value):
+		"""Return the items whose index value equals value."""
+		if index in self._hashed:
+			keys = self._hashed[index].get(value, ())
+		else:
+			entries = self._get_ordered(index)
+			lo = bisect.bisect_left(entries, (value,))
+			hi = bisect.bisect_left(entries, (value, math.inf))
+			keys = [entries[i][2] for i in range(lo, hi)]
+		data = self._data
+		return [data[key] for key in keys]
+
+	def find_one(self, index, value, default=None):
+		"""Return the first item whose index value equals value or default."""
+		found = self.find(index, value)
+		return found[0] if found else default
+
+	def find_range(self, index, low=None, high=None, inclusive=(True, False)):
+		"""Return the items whose index value lies between low and high.
+
+		A bound of None is open. inclusive tells whether low and high
+		themselves are included. Items come in index order.
+		"""
+		entries = self._get_ordered(index)
+		if low is None:
+			lo = 0
+		elif inclusive[0]:
+			lo = bisect.bisect_left(entries, (low,))
+		else:
+			lo = bisect.bisect_left(entries, (low, math.inf))
+		if high is None:
+			hi = len(entries)
+		elif inclusive[1]:
+			hi = bisect.bisect_left(entries, (high, math.inf))
+		else:
+			hi = bisect.bisect_left(entries, (high,))
+		data = self._data
+		return [data[entries[i][2]] for i in range(lo, hi)]
+
+	def index_values(self, index):
+		"""The distinct values of an index, sorted for ordered indexes."""
+		if index in self._hashed:
+			return list(self._hashed[index])
+		values = []
+		for entry in self._get_ordered(index):
+			if not values or values[-1] != entry[0]:
+				values.append(entry[0])
+		return values
+
+	def reindex(self, key=None):
+		"""Refresh the index entries of key, or of every item if key is None."""
+		keys = list(self._data) if key is None else [key]
+		for key in keys:
+			self[key] = self._data[key]
+
+	def _get_ordered(self, index):
+		try:
+			return self._ordered[index]
+		except KeyError:
+			raise KeyError("No ordered index named '{0}'.".format(index))
+
+	def _index(self, key, seq, fields):
+		# Entries added before a failure (an unhashable or incomparable
+		# value) are removed again, leaving the indexes as they were.
+		done = []
+		try:
+			for name, index in self._hashed.items():
+				keys = index.setdefault(fields[name], {})
+				keys[key] = None
+				done.append(name)
+				if len(keys) > 1:
+					self._keep_order(keys, seq)
+			for name, entries in self._ordered.items():
+				bisect.insort(entries, (fields[name], seq, key))
+				done.append(name)
+		except BaseException:
+			self._remove(key, seq, fields, done)
+			raise
+		# The indexed values are kept so that entries can be found and
+		# removed even after the item has been changed in place.
+		self._fields[key] = fields
+
+	def _keep_order(self, keys, seq):
+		# A replaced item is added back at the end of its hashed bucket;
+		# move it back to its insertion position.
+		last = reversed(keys)
+		next(last)
+		if self._seq[next(last)] > seq:
+			ordered = sorted(keys, key=lambda k: self._seq.get(k, seq))
+			keys.clear()
+			keys.update(dict.fromkeys(ordered))
+
+	def _unindex(self, key):
+		fields = self._fields.pop(key)
+		self._remove(key, self._seq[key], fields, self._getters)
+		return fields
+
+	def _remove(self, key, seq, fields, names):
+		for name in names:
+			if name in self._hashed:
+				index = self._hashed[name]
+				keys = index[fields[name]]
+				del keys[key]
+				if not keys:
+					del index[fields[name]]
+			else:
+				entries = self._ordered[name]
+				del entries[bisect.bisect_left(entries, (fields[name], seq))]
+
+	def __getitem__(self, key):
+		return self._data[key]
+
+	def __setitem__(self, key, value):
+		# All index values are computed before anything is changed.
+		fields = {name : get(value) for name, get in self._getters.items()}
+		if key not in self._data:
+			seq = self._counter
+			self._index(key, seq, fields)
+			self._seq[key] = seq
+			self._counter += 1
+		else:
+			seq = self._seq[key]
+			old = self._unindex(key)
+			try:
+				self._index(key, seq, fields)
+			except BaseException:
+				self._index(key, seq, old)
+				raise
+		self._data[key] = value
+
+	def __delitem__(self, key):
+		if key not in self._data:
+			raise KeyError(key)
+		self._unindex(key)
+		del self._data[key]
+		del self._seq[key]
+
+	def __contains__(self, key):
+		return key in self._data
+
+	def __iter__(self):
+		return iter(self._data)
+
+	def __len__(self):
+		return len(self._data)
+
+	def keys(self):
+		return list(self._data)
+
+	def items(self):
+		return list(self._data.items())
+
+	def values(self):
+		return list(self._data.values())
+
+	def clear(self):
+		self._data.clear()
+		self._seq.clear()
+		self._fields.clear()
+		for index in self._hashed.values():
+			index.clear()
+		for entries in self._ordered.values():
+			del entries[:]
+
+	def __getattr__(self, key):
+		if key.startswith('_'):
+			raise AttributeError(key)
+		try:
+			return self._data[key]
+		except KeyError:
+			raise AttributeError("Key {0} not found in stack.".format(key))
+
+	def __repr__(self):
+		return '{0}({1!r})'.format(self.__class__.__name__, self._data)
+
+
+def _attr_getter(name):
+	def get(value):
+		if isinstance(value, collections.abc.Mapping):
+			return value[name]
+		return getattr(value, name)
+	return get
+
+
 class UniqueAppender(object):
 	"""Appends items to a collection ensuring uniqueness.
 
-	Additional appends() of the same object are ignored.  Membership is
-	determined by identity (``is a``) not equality (``==``).
+	Additional appends() of the same object are ignored. By default
+	membership is determined by identity (``is a``) not equality (``==``).
+
+	by selects how items are told apart: None for identity, 'value' for
+	equality, 'weakref' for identity tracked through weak references (so
+	ids of collected objects can be reused safely; objects that do not
+	support weak references are kept alive instead) or a callable
+	returning a hashable key. window only remembers the most recently seen keys and
+	capacity uses a BloomFilter with the given error_rate, both in constant
+	memory at the cost of exactness.
 	"""
 
-	def __init__(self, data=None, via=None):
+	def __init__(self, data=None, via=None, by=None, window=None, capacity=None, error_rate=0.01):
 		self.data = [] if data is None else data
-		self._unique = {}
 		if via:
-			self._data_appender = getattr(data, via)
-		elif hasattr(data, 'append'):
-			self._data_appender = data.append
-		elif hasattr(data, 'add'):
-			self._data_appender = data.add
+			self._data_appender = getattr(self.data, via)
+		elif hasattr(self.data, 'append'):
+			self._data_appender = self.data.append
+		elif hasattr(self.data, 'add'):
+			self._data_appender = self.data.add
+
+		if by == 'weakref':
+			if window is not None or capacity is not None:
+				raise ValueError("The weakref mode cannot be bounded by window or capacity.")
+			self._key = None
+			self._unique = _WeakIdentitySet()
+		else:
+			self._key = id if by is None else _unique_key(by)
+			self._unique = _seen_set(window, capacity, error_rate)
 
 	def append(self, *items):
+		key = self._key
+		add = self._unique.add
 		for item in items:
-			id_ = id(item)
-			if id_ not in self._unique:
+			if add(item if key is None else key(item)):
 				self._data_appender(item)
-				self._unique[id_] = True
 
 	def __iter__(self):
 		return iter(self.data)
 
 
+class LRUCache(object):
+	"""A bounded mapping that evicts the least recently used keys.
+
+	Hits and misses of get() are counted. A maxsize of 0 disables caching.
+	"""
+
+	def __init__(self, maxsize=128):
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self._data = collections.OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key, default=None):
+		try:
+			value = self._data[key]
+		except KeyError:
+			self.misses += 1
+			return default
+		try:
+			self._data.move_to_end(key)
+		except KeyError:
+			pass
+		self.hits += 1
+		return value
+
+	def set(self, key, value):
+		if self.maxsize <= 0:
+			return
+		with self._lock:
+			self._data[key] = value
+			self._data.move_to_end(key)
+			if len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+			self.hits = self.misses = 0
+
+	def info(self):
+		return dict(hits=self.hits, misses=self.misses, maxsize=self.maxsize, size=len(self._data))
+
+	def __contains__(self, key):
+		return key in self._data
+
+	def __len__(self):
+		return len(self._data)
+
+
+class BloomFilter(object):
+	"""A fixed size probabilistic set.
+
+	It may report an item that was never added as seen (at roughly
+	error_rate once capacity items were added) but never the reverse.
+	"""
+
+	def __init__(self, capacity, error_rate=0.01):
+		if capacity <= 0 or not 0 < error_rate < 1:
+			raise ValueError("BloomFilter needs a positive capacity and 0 < error_rate < 1.")
+		self.capacity = capacity
+		self.error_rate = error_rate
+		self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+		self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+		self.bits = bytearray((self.size + 7) // 8)
+
+	def _positions(self, item):
+		# Spread the hash with splitmix64 and derive k positions from it.
+		z = (hash(item) + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+		z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+		z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+		z ^= z >> 31
+		h1, h2, size = z & 0xFFFFFFFF, (z >> 32) | 1, self.size
+		return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+	def add(self, item):
+		"""Add the item, returning False if it was (probably) seen before."""
+		bits = self.bits
+		added = False
+		for position in self._positions(item):
+			byte, mask = position >> 3, 1 << (position & 7)
+			if not bits[byte] & mask:
+				bits[byte] |= mask
+				added = True
+		return added
+
+	def __contains__(self, item):
+		bits = self.bits
+		return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+
+class _SeenSet(set):
+	"""The exact seen-set, add() returns whether the key was new."""
+
+	def add(self, key):
+		if key in self:
+			return False
+		set.add(self, key)
+		return True
+
+
+class _RecentSet(object):
+	"""Remembers the maxsize most recently seen keys."""
+
+	def __init__(self, maxsize):
+		if maxsize <= 0:
+			raise ValueError("The window must be positive.")
+		self.maxsize = maxsize
+		self._keys = collections.OrderedDict()
+
+	def add(self, key):
+		keys = self._keys
+		if key in keys:
+			keys.move_to_end(key)
+			return False
+		keys[key] = None
+		if len(keys) > self.maxsize:
+			keys.popitem(last=False)
+		return True
+
+	def __contains__(self, key):
+		return key in self._keys
+
+	def __len__(self):
+		return len(self._keys)
+
+
+class _WeakIdentitySet(object):
+	"""Tracks objects by identity and forgets them once they are collected.
+
+	Objects that cannot be weakly referenced (dicts, lists, tuples, strings,
+	ints and other builtins) are held strongly instead, so their ids cannot
+	be reused while they are tracked, and they are never forgotten.
+	"""
+
+	def __init__(self):
+		self._refs = {}
+
+	def add(self, item):
+		id_ = id(item)
+		if id_ in self._refs:
+			return False
+		try:
+			ref = weakref.ref(item, lambda ref, id_=id_, refs=self._refs: refs.pop(id_, None))
+		except TypeError:
+			ref = item
+		self._refs[id_] = ref
+		return True
+
+	def __contains__(self, item):
+		return id(item) in self._refs
+
+	def __len__(self):
+		return len(self._refs)
+
+
+def _seen_set(window=None, capacity=None, error_rate=0.01):
+	if window is not None and capacity is not None:
+		raise ValueError("Use either a window or a capacity, not both.")
+	if window is not None:
+		return _RecentSet(window)
+	if capacity is not None:
+		return BloomFilter(capacity, error_rate)
+	return _SeenSet()
+
+
+def _unique_key(by):
+	if by == 'value':
+		return None
+	if callable(by):
+		return by
+	raise ValueError("Unknown uniqueness mode {0!r}.".format(by))
+
+
+def record(name, fields, defaults=None, module=None):
+	"""Create a Record subclass with the given field names.
+
+	Like namedtuple(), field names must be unique identifiers that are not
+	keywords and do not start with an underscore. Names of Record methods
+	and attributes (get, keys, items, ...) are rejected as well, since the
+	fields would shadow them.
+	"""
+	if isinstance(fields, str):
+		fields = fields.replace(',', ' ').split()
+	fields = tuple(fields)
+	seen = set()
+	for field in fields:
+		if not isinstance(field, str) or not field.isidentifier() or keyword.iskeyword(field):
+			raise ValueError("Field names must be identifiers that are not keywords: {0!r}.".format(field))
+		if field.startswith('_'):
+			raise ValueError("Field names cannot start with an underscore: {0!r}.".format(field))
+		if hasattr(Record, field):
+			raise ValueError("Field name {0!r} shadows a Record attribute.".format(field))
+		if field in seen:
+			raise ValueError("Duplicate field name {0!r}.".format(field))
+		seen.add(field)
+	if module is None:
+		module = sys._getframe(1).f_globals.get('__name__', '__main__')
+	namespace = dict(__slots__=fields, __defaults__=dict(defaults or {}), __module__=module)
+	return type(name, (Record,), namespace)
+
+
 def stack(*args, **kwargs):
 	return Stack(*args, **kwargs)
 
@@ -198,18 +1164,75 @@ def unique_list(seq, hashfunc=None):
 				if x not in seen
 				and not seen_add(x)]
 	else:
-		return [x for x in seq
-				if hashfunc(x) not in seen
-				and not seen_add(hashfunc(x))]
+		return list(iter_unique(seq, hashfunc))
+
+
+def iter_unique(iterable, key=None, maxsize=None, capacity=None, error_rate=0.01):
+	"""Lazily yield the distinct items of iterable in the order they arrive.
+
+	key is called once per item to get the value compared for uniqueness.
+	maxsize only remembers that many recently seen keys (an LRU) and
+	capacity uses a BloomFilter sized for that many keys, bounding memory
+	for unbounded streams at the cost of exactness.
+	"""
+	if maxsize is None and capacity is None:
+		seen = set()
+		seen_add = seen.add
+		if key is None:
+			for item in iterable:
+				if item not in seen:
+					seen_add(item)
+					yield item
+		else:
+			for item in iterable:
+				k = key(item)
+				if k not in seen:
+					seen_add(k)
+					yield item
+		return
+
+	add = _seen_set(maxsize, capacity, error_rate).add
+	for item in iterable:
+		if add(item if key is None else key(item)):
+			yield item
 
 
 def to_list(x, default=None):
 	if x is None:
 		return default
-	if not isinstance(x, collections.Iterable) or isinstance(x, str):
+	if not isinstance(x, collections.abc.Iterable) or isinstance(x, str):
 		return [x]
 	elif isinstance(x, list):
 		return x
 	else:
 		return list(x)
 
+
+def to_sequence(x, default=None, lazy=False):
+	"""Like to_list() but avoids copying data that is already a sequence.
+
+	Lists, tuples, ranges, bytes, bytearrays, memoryviews, array.array,
+	NumPy arrays and other sequences are returned as they are, so like
+	to_list() bytes are treated as a sequence of ints. Iterators and
+	generators are returned untouched when lazy is true and materialized
+	into a list otherwise. Strings and other scalars are wrapped in a list.
+	"""
+	if x is None:
+		return default
+	if isinstance(x, str):
+		return [x]
+	if isinstance(x, collections.abc.Sequence):
+		return x
+	if hasattr(x, '__array__') and getattr(x, 'shape', None) is not None:
+		# NumPy arrays (and alikes); zero dimensional ones are scalars.
+		return x if x.shape else [x]
+	if isinstance(x, collections.abc.Iterator):
+		return x if lazy else list(x)
+	if isinstance(x, collections.abc.Iterable):
+		return list(x)
+	return [x]
+
+
+def ensure_iterable(x, default=None):
+	"""Return x as an iterable without copying it, wrapping scalars in a list."""
+	return to_sequence(x, default, lazy=True)
@@ -1,4 +1,4 @@
-from tea.collections import stack
+from tea.collections import ConcurrentStack
 from django.utils import timezone
 from django.db.models import DateTimeField, options
 
@@ -14,7 +14,7 @@ from django.db.models import DateTimeField, options
 # class ANYTHING:
 # 	pass
 
-META_OPTIONS = stack()
+META_OPTIONS = ConcurrentStack()
 
 
 # def model_timestamp_field(*args, **kwargs):
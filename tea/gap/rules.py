@@ -1,13 +1,22 @@
 import re
+import inspect
+import string
 from tea.constants import NOT_PROVIDED, EMPTY, NOTHING
 from .core import ValidationError, DataSet
-from tea.collections import stack
+from tea.collections import stack, LRUCache
 from tea import uzi
 from tea.utils import six
 from tea.utils.ipv46 import IPV4_REGEX, is_valid_ipv6, is_valid_ipv4, is_valid_ip
 from tea.utils.encoding import force_text
 from urllib.parse import urlsplit, urlunsplit
 from cached_property import cached_property
+from numbers import Number
+from functools import lru_cache
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 ##################################################################
 # Constants
@@ -17,6 +26,26 @@ MISSING_VALUES = (NOT_PROVIDED, NOTHING, None, '')
 EMPTY_VALUES = MISSING_VALUES
 EMPTY_COLLECTIONS = ([], (), {})
 EMPTY_VALUES_AND_COLLECTIONS = EMPTY_VALUES + EMPTY_COLLECTIONS
+REGEX_CACHE_SIZE = 256
+
+
+def compile_regex(regex, flags=0):
+	"""Compile a regular expression, sharing the result process-wide.
+
+	Patterns are kept in a bounded LRU keyed by (regex, flags). Hit and miss
+	counters are available from compile_regex.cache_info().
+	"""
+	# Always pass flags positionally so that compile_regex(p) and
+	# compile_regex(p, 0) share one cache entry.
+	return _compile_regex(regex, flags)
+
+
+@lru_cache(maxsize=REGEX_CACHE_SIZE)
+def _compile_regex(regex, flags):
+	return re.compile(regex, flags)
+
+compile_regex.cache_info = _compile_regex.cache_info
+compile_regex.cache_clear = _compile_regex.cache_clear
 
 
 ##################################################################
@@ -32,8 +61,25 @@ class RuleMeta(type):
 		for base in reversed(bases):
 			if isinstance(base, RuleMeta):
 				cls.placeholders.update(base.placeholders)
+		_bind_check_many(cls, nspace)
 		return cls
 
+
+def _bind_check_many(cls, nspace):
+	"""Keep check_many() and columnar in step with the class's check().
+
+	Each class must opt in to columnar itself, since its check() may use
+	the data set. A specialised check_many() is only inherited along with
+	the check() it was written for; otherwise the per value default of
+	Rule is used.
+	"""
+	if 'columnar' not in nspace:
+		cls.columnar = False
+	checks = next((c for c in cls.__mro__ if 'check' in c.__dict__), None)
+	many = next((c for c in cls.__mro__ if 'check_many' in c.__dict__), None)
+	if checks is not many and checks is not None and many is not None and issubclass(checks, many):
+		cls.check_many = Rule.check_many
+
 class Rule(metaclass=RuleMeta):
 	"""The Base Validation Rules Class"""
 	message = ""
@@ -41,6 +87,7 @@ class Rule(metaclass=RuleMeta):
 	placeholders = None
 	ignore_empty = False
 	empty_values = EMPTY_VALUES
+	columnar = False
 	_name_placeholder_key = '__name__'
 	_value_placeholder_key = '__value__'
 
@@ -69,13 +116,24 @@ class Rule(metaclass=RuleMeta):
 
 	def validate(self, value, data_set=None, placeholders=None):
 		if not self.check(value, data_set):
-			if isinstance(data_set, DataSet):
-				data_set = data_set.data
-			value_placeholder = {
-				self._value_placeholder_key : self.clean_value(value)
-			}
-			placeholders = self.get_placeholders(placeholders, data_set, value_placeholder)
-			raise self.create_error(placeholders)
+			raise self.get_error(value, data_set, placeholders)
+
+	async def validate_async(self, value, data_set=None, placeholders=None):
+		if not await self.check_async(value, data_set):
+			raise self.get_error(value, data_set, placeholders)
+
+	def is_valid(self, value, data_set=None):
+		"""Check the value without building an error when it fails."""
+		return bool(self.check(value, data_set))
+
+	def get_error(self, value, data_set=None, placeholders=None):
+		if isinstance(data_set, DataSet):
+			data_set = data_set.data
+		value_placeholder = {
+			self._value_placeholder_key : self.clean_value(value)
+		}
+		placeholders = self.get_placeholders(placeholders, data_set, value_placeholder)
+		return self.create_error(placeholders)
 
 	def should_ignore(self, value):
 		return self.ignore_empty and value in self.empty_values
@@ -84,6 +142,29 @@ class Rule(metaclass=RuleMeta):
 		error = "Abstract method check() is not implemented in {0}."
 		raise NotImplementedError(error.format(self.__class__))
 
+	async def check_async(self, value, data_set=None):
+		"""Check the value, awaiting the result if check() returned an awaitable."""
+		return await _await(self.check(value, data_set))
+
+	def check_many(self, values):
+		"""Check a column of values at once.
+
+		Returns a list of booleans, or a boolean array for NumPy input. Only
+		rules flagged as columnar (whose check() ignores the data set) can
+		be checked this way.
+		"""
+		check = self.check
+		return [check(value) for value in values]
+
+	def _vectorizes(self, values, kinds):
+		return _is_array(values, kinds) and \
+			(not self.ignore_empty or self.empty_values is EMPTY_VALUES)
+
+	def _ignored_many(self, values, mask):
+		if self.ignore_empty and values.dtype.kind == 'U':
+			mask |= values == ''
+		return mask
+
 	def create_error(self, placeholders):
 		return ValidationError(self.get_message(), self.get_code(), placeholders)
 
@@ -122,6 +203,7 @@ class Rule(metaclass=RuleMeta):
 class Required(Rule):
 	message = "The `{__name__}` field is required."
 	missing = MISSING_VALUES
+	columnar = True
 
 	def __init__(self, missing=None, **kwargs):
 		super(Required, self).__init__(**kwargs)
@@ -131,14 +213,25 @@ class Required(Rule):
 	def check(self, value, data_set=None):
 		return value not in self.missing
 
+	def check_many(self, values):
+		if self.missing is MISSING_VALUES:
+			if _is_array(values, 'biuf'):
+				return numpy.ones(len(values), dtype=bool)
+			if _is_array(values, 'U'):
+				return values != ''
+		missing = self.missing
+		return [value not in missing for value in values]
+
 class NotEmpty(Rule):
 	message = "The `{__name__}` field should not be empty."
+	columnar = True
 
 	def check(self, value, data_set=None):
 		return value not in EMPTY_VALUES_AND_COLLECTIONS
 
 class Empty(Rule):
 	message = "The `{__name__}` field should be empty."
+	columnar = True
 
 	def check(self, value, data_set=None):
 		return value in EMPTY_VALUES_AND_COLLECTIONS
@@ -155,6 +248,7 @@ class Regex(Rule):
 	# code = 'invalid_regex'
 	inverse_match = False
 	flags = 0
+	columnar = True
 
 	def __init__(self, regex=None, message=None, placeholders=None, name=None,
 	             code=None, inverse_match=None, flags=None, ignore_empty=None, empty_values=None):
@@ -172,19 +266,28 @@ class Regex(Rule):
 			raise TypeError("If the flags are set, regex must be a regular expression string.")
 
 		if isinstance(self.regex, six.string_types):
-			self.regex = re.compile(self.regex, self.flags)
+			self.regex = compile_regex(self.regex, self.flags)
 
 	def check(self, value, data_set=None):
 		return self.should_ignore(value) or \
 			self.inverse_match is not bool(self.regex.search(force_text(value)))
 
+	def check_many(self, values):
+		search = self.regex.search
+		inverse_match = self.inverse_match
+		ignore_empty = self.ignore_empty
+		empty_values = self.empty_values
+		return [(ignore_empty and value in empty_values) or
+				inverse_match is not bool(search(force_text(value)))
+				for value in values]
+
 
 ##################################################################
 # URLs
 ##################################################################
 
 class Url(Regex):
-	regex = re.compile(
+	regex = compile_regex(
 		r'^(?:[a-z0-9\.\-]*)://'  # scheme is validated separately
 		r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}(?<!-)\.?)|'  # domain...
 		r'localhost|'  # localhost...
@@ -192,16 +295,34 @@ class Url(Regex):
 		r'\[?[A-F0-9]*:[A-F0-9:]+\]?)'  # ...or ipv6
 		r'(?::\d+)?'  # optional port
 		r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+	# The default pattern, which single pass mode tries first.
+	url_regex = regex
+
+	# Used by the single pass parser for IPv6 hosts and other authorities
+	# its plain checks do not accept.
+	authority_regex = compile_regex(
+		r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}(?<!-)\.?)|'  # domain...
+		r'localhost|'  # localhost...
+		r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}|'  # ...or ipv4
+		r'\[?[A-F0-9]*:[A-F0-9:]+\]?)'  # ...or ipv6
+		r'(?::\d+)?', re.IGNORECASE)  # optional port
+	host_chars = frozenset(string.ascii_letters + string.digits + '-.')
 
 	message ="The `{__name__}` must be a valid URL."
 	schemes = ['http', 'https', 'ftp', 'ftps']
+	single_pass = False
+	columnar = True
 
-	def __init__(self, schemes=None, **kwargs):
+	def __init__(self, schemes=None, single_pass=None, **kwargs):
 		super(Url, self).__init__(**kwargs)
 		if schemes is not None:
 			self.schemes = schemes
+		if single_pass is not None:
+			self.single_pass = single_pass
 
 	def check(self, value, data_set=None):
+		if self.single_pass:
+			return self.check_single_pass(value)
 		if self.should_ignore(value):
 			return True
 		value = force_text(value)
@@ -224,10 +345,96 @@ class Url(Regex):
 		url = urlunsplit((scheme, netloc, path, query, fragment))
 		return super(Url, self).check(url, data_set)
 
+	def check_single_pass(self, value):
+		"""Check the URL without the urlsplit() round trip of the regex mode.
+
+		URLs the default pattern accepts pass after one match. Others are
+		split once and their parts checked with string methods, IDNA
+		encoding the authority (with a cache) only when it contains
+		non-ASCII characters. Tabs and newlines are removed first, as
+		urlsplit() does in the regex mode. A custom regex is not used in
+		this mode.
+		"""
+		if self.should_ignore(value):
+			return True
+		value = force_text(value)
+		if '\t' in value or '\n' in value or '\r' in value:
+			value = value.translate(_URL_UNSAFE_CHARS)
+		scheme, sep, rest = value.partition('://')
+		if not sep or scheme.lower() not in self.schemes:
+			return False
+		if self.url_regex.match(value) is not None:
+			return True
+		idna = True
+		if rest.startswith('//'):
+			# Round tripping through urlsplit() drops an empty authority
+			# (and there is then no authority to IDNA encode).
+			rest, idna = rest[2:], False
+
+		end = len(rest)
+		for char in '/?':
+			index = rest.find(char, 0, end)
+			if index != -1:
+				end = index
+		authority, tail = rest[:end], rest[end:]
+
+		if tail and tail.split() != [tail]:
+			return False
+
+		if not authority.isascii():
+			authority = _idna_encode(authority) if idna else None
+			if authority is None:
+				return False
+
+		host, sep, port = authority.rpartition(':')
+		if not sep:
+			host = authority
+		elif port.isdigit() and self.is_valid_host(host):
+			return True
+		else:
+			# IPv6 addresses and the like are left to the regex.
+			return self.authority_regex.fullmatch(authority) is not None
+		return self.is_valid_host(host)
+
+	def is_valid_host(self, host):
+		"""Whether host is localhost, an IPv4-like address or a domain name."""
+		if not self.host_chars.issuperset(host):
+			return False
+		if host.lower() == 'localhost':
+			return True
+
+		labels = host.split('.')
+		if len(labels) == 4 and all(0 < len(l) <= 3 and l.isdigit() for l in labels):
+			return True
+
+		if labels[-1] == '':  # A trailing dot.
+			labels.pop()
+		if len(labels) < 2:
+			return False
+		tld = labels.pop()
+		if len(tld) < 2 or tld[-1] == '-':
+			return False
+		for label in labels:
+			if not label or len(label) > 63 or label[0] == '-' or label[-1] == '-':
+				return False
+		return True
+
+
+_URL_UNSAFE_CHARS = {ord(c) : None for c in '\t\r\n'}
+
+
+@lru_cache(maxsize=4096)
+def _idna_encode(authority):
+	try:
+		return authority.encode('idna').decode('ascii')  # IDN -> ACE
+	except UnicodeError:  # invalid domain part
+		return None
+
 
 class Slug(Regex):
-	regex = re.compile(r'^[-a-zA-Z0-9_]+$')
+	regex = compile_regex(r'^[-a-zA-Z0-9_]+$')
 	message = "The `{__name__}` should only consist of letters, numbers, underscores or hyphens."
+	columnar = True
 
 
 ##################################################################
@@ -236,6 +443,7 @@ class Slug(Regex):
 
 class Email(Rule):
 	message = "The `{__name__}` must be a valid email address."
+	columnar = True
 	user_regex = re.compile(
 		r"(^[-!#$%&'*+/=?^_`{}|~0-9A-Z]+(\.[-!#$%&'*+/=?^_`{}|~0-9A-Z]+)*$"  # dot-atom
 		r'|^"([\001-\010\013\014\016-\037!#-\[\]-\177]|\\[\001-\011\013\014\016-\177])*"$)',  # quoted-string
@@ -248,11 +456,25 @@ class Email(Rule):
 		r'\[([A-f0-9:\.]+)\]$',
 		re.IGNORECASE)
 	domain_whitelist = ['localhost', '127.0.0.1']
+	domain_cache_size = 4096
+	_domain_caches = {}
 
-	def __init__(self, whitelist=None, **kwargs):
+	def __init__(self, whitelist=None, domain_cache_size=None, **kwargs):
 		super(Email, self).__init__(**kwargs)
 		if whitelist is not None:
 			self.domain_whitelist = whitelist
+		if domain_cache_size is not None:
+			self.domain_cache = LRUCache(domain_cache_size)
+		else:
+			self.domain_cache = self.get_shared_domain_cache()
+
+	@classmethod
+	def get_shared_domain_cache(cls):
+		"""The domain verdict cache shared by instances of this class."""
+		cache = Email._domain_caches.get(cls)
+		if cache is None:
+			cache = Email._domain_caches[cls] = LRUCache(cls.domain_cache_size)
+		return cache
 
 	def check(self, value, data_set=None):
 		if self.should_ignore(value):
@@ -268,7 +490,40 @@ class Email(Rule):
 		if not self.user_regex.match(user):
 			return False
 
-		if domain in self.domain_whitelist or self.check_domain(domain):
+		return domain in self.domain_whitelist or self.is_valid_domain(domain)
+
+	def check_many(self, values):
+		user_match = self.user_regex.match
+		verdicts = {}
+		results = []
+		for value in values:
+			if self.should_ignore(value):
+				results.append(True)
+				continue
+
+			value = force_text(value)
+			if not value or '@' not in value:
+				results.append(False)
+				continue
+
+			user, domain = value.rsplit('@', 1)
+			verdict = verdicts.get(domain)
+			if verdict is None:
+				verdict = verdicts[domain] = \
+					domain in self.domain_whitelist or self.is_valid_domain(domain)
+			results.append(verdict and bool(user_match(user)))
+		return results
+
+	def is_valid_domain(self, domain):
+		"""Check the domain part, including its IDNA form, using the cache."""
+		verdict = self.domain_cache.get(domain)
+		if verdict is None:
+			verdict = self._check_domain_part(domain)
+			self.domain_cache.set(domain, verdict)
+		return verdict
+
+	def _check_domain_part(self, domain):
+		if self.check_domain(domain):
 			return True
 
 		# Try for possible IDN domain-part
@@ -295,11 +550,13 @@ class Email(Rule):
 
 class IPv4(Regex):
 	message = "The `{__name__}` must be a valid IPv4 address."
-	regex = IPV4_REGEX
+	columnar = True
+	regex = compile_regex(IPV4_REGEX.pattern)
 
 
 class IPv6(Rule):
 	message = "The `{__name__}` must be a valid IPv6 address."
+	columnar = True
 
 	def check(self, value, data_set=None):
 		return self.should_ignore(value) or is_valid_ipv6(force_text(value))
@@ -307,6 +564,7 @@ class IPv6(Rule):
 
 class IP(Rule):
 	message = "The `{__name__}` must be a valid IP address."
+	columnar = True
 
 	def check(self, value, data_set=None):
 		return self.should_ignore(value) or is_valid_ip(force_text(value))
@@ -322,6 +580,7 @@ IpAddress = IP
 
 class Integer(Rule):
 	message = "The `{__name__}` must be an integer."
+	columnar = True
 
 	def check(self, value, data_set=None):
 		if self.should_ignore(value):
@@ -331,6 +590,14 @@ class Integer(Rule):
 		except (ValueError, TypeError):
 			return False
 
+	def check_many(self, values):
+		if self._vectorizes(values, 'iu'):
+			return numpy.ones(len(values), dtype=bool)
+		# str() of floats and booleans never matches str(int(value)).
+		if self._vectorizes(values, 'bf'):
+			return numpy.zeros(len(values), dtype=bool)
+		return super(Integer, self).check_many(values)
+
 
 ##################################################################
 # Limits
@@ -338,41 +605,83 @@ class Integer(Rule):
 
 class _Limit(Rule):
 	limit = None
+
 	def __init__(self, limit, **kwargs):
 		super(_Limit, self).__init__(**kwargs)
 		self.limit = limit
 		self.placeholders['limit'] = limit
 
+	def _numeric_many(self, values):
+		return self._vectorizes(values, 'biuf') and isinstance(self.limit, Number)
+
+	def _lengths_many(self, values):
+		return self._vectorizes(values, 'U') and isinstance(self.limit, Number)
+
 class Max(_Limit):
 	message = "The `{__name__}` must be less than or equal to {limit}."
+	columnar = True
 
 	def check(self, value, data_set=None):
 		return self.should_ignore(value) or self.limit >= value
 
+	def check_many(self, values):
+		if self._numeric_many(values):
+			return values <= self.limit
+		limit, ignore_empty, empty_values = self.limit, self.ignore_empty, self.empty_values
+		return [(ignore_empty and value in empty_values) or limit >= value for value in values]
+
 class Min(_Limit):
 	message = "The `{__name__}` must be greater than or equal to {limit}."
+	columnar = True
 
 	def check(self, value, data_set=None):
 		return self.should_ignore(value) or self.limit <= value
 
+	def check_many(self, values):
+		if self._numeric_many(values):
+			return values >= self.limit
+		limit, ignore_empty, empty_values = self.limit, self.ignore_empty, self.empty_values
+		return [(ignore_empty and value in empty_values) or limit <= value for value in values]
+
 class MaxLen(_Limit):
 	message = "The `{__name__}` must be at most {limit} character(s)."
+	columnar = True
 
 	def check(self, value, data_set=None):
 		return self.should_ignore(value) or self.limit >= len(value)
 
+	def check_many(self, values):
+		if self._lengths_many(values):
+			return self._ignored_many(values, numpy.char.str_len(values) <= self.limit)
+		limit, ignore_empty, empty_values = self.limit, self.ignore_empty, self.empty_values
+		return [(ignore_empty and value in empty_values) or limit >= len(value) for value in values]
+
 class MinLen(_Limit):
 	message = "The `{__name__}` must be at least {limit} character(s)."
+	columnar = True
 
 	def check(self, value, data_set=None):
 		return self.should_ignore(value) or self.limit <= len(value)
 
+	def check_many(self, values):
+		if self._lengths_many(values):
+			return self._ignored_many(values, numpy.char.str_len(values) >= self.limit)
+		limit, ignore_empty, empty_values = self.limit, self.ignore_empty, self.empty_values
+		return [(ignore_empty and value in empty_values) or limit <= len(value) for value in values]
+
 class Length(_Limit):
 	message = "The `{__name__}` must be {limit} character(s)."
+	columnar = True
 
 	def check(self, value, data_set=None):
 		return self.should_ignore(value) or self.limit == len(value)
 
+	def check_many(self, values):
+		if self._lengths_many(values):
+			return self._ignored_many(values, numpy.char.str_len(values) == self.limit)
+		limit, ignore_empty, empty_values = self.limit, self.ignore_empty, self.empty_values
+		return [(ignore_empty and value in empty_values) or limit == len(value) for value in values]
+
 
 ##################################################################
 #
@@ -397,6 +706,11 @@ class Passes(Rule):
 		return self.should_ignore(value) or \
 			self.condition(value, data_set, *self.args, **self.kwargs)
 
+	async def check_async(self, value, data_set=None):
+		if self.should_ignore(value):
+			return True
+		return await _await(self.condition(value, data_set, *self.args, **self.kwargs))
+
 class Fails(Rule):
 	message = "The `{__name__}` must fail a condition."
 	condition = None
@@ -416,6 +730,11 @@ class Fails(Rule):
 		return self.should_ignore(value) or \
 			not self.condition(value, data_set, *self.args, **self.kwargs)
 
+	async def check_async(self, value, data_set=None):
+		if self.should_ignore(value):
+			return True
+		return not await _await(self.condition(value, data_set, *self.args, **self.kwargs))
+
 
 class Same(Rule):
 	message = "The `{__name__}` and `{other}` fields must match."
@@ -440,6 +759,7 @@ class Equals(Rule):
 	_other_value = None
 	as_str = False
 	_check_cache = False
+	columnar = True
 
 	def __init__(self, value, as_str=False, **kwargs):
 		super(Equals, self).__init__(**kwargs)
@@ -465,12 +785,14 @@ class Equals(Rule):
 ##################################################################
 
 class PhoneNumber(Regex):
-	regex = re.compile(r'^\+?1?\d{9,15}$')
+	regex = compile_regex(r'^\+?1?\d{9,15}$')
 	message = "The '{__name__}' field must be a valid phone number in the format: '+xxxxxxxxxx'. Up to 15 digits allowed."
+	columnar = True
 
 class PhoneNumberE164(Regex):
-	regex = re.compile(r'^\+[1-9]\d{8,14}$')
+	regex = compile_regex(r'^\+[1-9]\d{8,14}$')
 	message = "The '{__name__}' field must be a valid phone number in the format: '+xxxxxxxxxx'. Up to 15 digits allowed."
+	columnar = True
 
 ##################################################################
 # Functions
@@ -486,6 +808,18 @@ def _update_placeholders(placeholders, *args, **kwargs):
 	return placeholders
 
 
+async def _await(result):
+	if inspect.isawaitable(result):
+		result = await result
+	return result
+
+
+def _is_array(values, kinds=None):
+	if numpy is None or not isinstance(values, numpy.ndarray):
+		return False
+	return kinds is None or values.dtype.kind in kinds
+
+
 def _get_rule_instance(rule, name=None, message=None):
 	if isinstance(rule, RuleMeta):
 		rule = rule()
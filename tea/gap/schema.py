@@ -0,0 +1,364 @@
+import asyncio
+from tea.collections import stack, record
+from tea.constants import NOT_PROVIDED
+from .core import ValidationError, DataSet
+from . import rules
+
+
+FieldDefinition = record('FieldDefinition', [
+	'attribute', 'rules', 'display_name', 'error_message', 'if_passes', 'if_fails', 'clean'
+])
+
+ParsedFields = record('ParsedFields', ['all', 'default', 'if_passes', 'if_fails'])
+
+
+class CompiledField(object):
+	"""A field definition whose rules have been resolved to instances."""
+	__slots__ = ('attribute', 'display_name', 'error_message', 'rules',
+				'clean', 'if_passes', 'if_fails', 'definition', 'checks')
+
+	def __init__(self, field):
+		self.attribute = field.attribute
+		self.display_name = field.display_name
+		self.error_message = field.error_message
+		self.clean = field.clean
+		self.if_passes = field.if_passes or ()
+		self.if_fails = field.if_fails or ()
+		self.definition = field
+		self.rules = tuple(
+			rules._get_rule_instance(rule, field.display_name, field.error_message)
+			for rule in field.rules)
+		self.checks = tuple(_get_checker(rule) for rule in self.rules)
+
+	def should_run(self, status):
+		"""Whether the if_passes/if_fails conditions of the field hold.
+
+		status maps the attributes of the fields validated so far to True
+		(passed) or False (failed). Skipped fields neither pass nor fail.
+		"""
+		for name in self.if_passes:
+			if status.get(name) is not True:
+				return False
+		if self.if_fails:
+			return any(status.get(name) is False for name in self.if_fails)
+		return True
+
+	def get_value(self, data):
+		return self.clean(data.get(self.attribute), field=self.definition, data=data)
+
+	def validate(self, data):
+		value = self.get_value(data)
+		for rule in self.rules:
+			try:
+				rule(value, data)
+			except ValidationError as error:
+				return error
+
+	async def validate_async(self, data):
+		value = self.get_value(data)
+		for rule in self.rules:
+			try:
+				if isinstance(rule, rules.Rule):
+					await rule.validate_async(value, data)
+				else:
+					await rules._await(rule(value, data))
+			except ValidationError as error:
+				return error
+
+	def is_valid(self, data):
+		value = self.get_value(data)
+		for check in self.checks:
+			if not check(value, data):
+				return False
+		return True
+
+
+class Schema(object):
+	"""A rule set compiled once so that it can be used to validate many data sets.
+
+	Fields are partitioned, rule classes are instantiated and display names
+	and error messages are bound to the rules when the schema is created.
+	Fields with if_passes/if_fails conditions are ordered into stages that
+	follow the fields they depend on, and are skipped when the conditions
+	do not hold.
+	"""
+
+	def __init__(self, rule_set):
+		if callable(rule_set):
+			rule_set = rule_set()
+		self.fields = _parse_fields(rule_set)
+		self.stages = _plan(self.fields)
+		self.plan = tuple(f for stage in self.stages for f in stage)
+		self.default = self.stages[0] if self.stages else ()
+
+	def validate(self, data):
+		return self._validate(DataSet(data))
+
+	async def validate_async(self, data):
+		"""Validate data, awaiting coroutine rules and conditions.
+
+		Fields are validated concurrently, the rules of each field in order.
+		"""
+		data = DataSet(data)
+		status = {}
+		results = []
+		for stage in self.stages:
+			stage = [f for f in stage if f.should_run(status)]
+			errors = await asyncio.gather(*(f.validate_async(data) for f in stage))
+			for field, error in zip(stage, errors):
+				status[field.attribute] = error is None
+				results.append((field, error))
+		return _make_error(results)
+
+	def is_valid(self, data):
+		"""Return whether data passes, stopping at the first failing field.
+
+		No ValidationError is constructed.
+		"""
+		data = DataSet(data)
+		status = {}
+		for field in self.plan:
+			if field.should_run(status):
+				if not field.is_valid(data):
+					return False
+				status[field.attribute] = True
+		return True
+
+	def validate_many(self, rows, max_errors=None):
+		"""Validate each item in rows, yielding (index, error) pairs.
+
+		The error is None for valid rows. Iteration stops after max_errors
+		invalid rows when max_errors is given. A mapping of columns is
+		dispatched to validate_columns().
+		"""
+		if isinstance(rows, dict):
+			return self.validate_columns(rows, max_errors=max_errors)
+		return self._validate_rows(rows, max_errors)
+
+	def validate_columns(self, columns, max_errors=None):
+		"""Validate a mapping of attribute names to equally sized columns.
+
+		Each column (a list, tuple or NumPy array) is passed through the
+		check_many() of columnar rules. Rows are only assembled from the
+		columns to evaluate other rules and to build errors.
+		"""
+		size = _column_size(columns)
+		table = _Columns(columns)
+		errors = {}
+		ran = {}
+		failed = {}
+		for field in self.plan:
+			indices = _column_indices(field, ran, failed, size)
+			errors_for = _validate_column(field, table, size, indices)
+			for index, error in errors_for:
+				errors.setdefault(index, stack())[field.attribute] = error
+			ran[field.attribute] = None if indices is None else set(indices)
+			failed[field.attribute] = set(index for index, error in errors_for)
+
+		failed = 0
+		for index in range(size):
+			error = errors.get(index)
+			if error is None:
+				yield index, None
+				continue
+			yield index, ValidationError(error)
+			failed += 1
+			if max_errors is not None and failed >= max_errors:
+				return
+
+	def _validate_rows(self, rows, max_errors):
+		failed = 0
+		data_set = None
+		reusable = False
+		for index, row in enumerate(rows):
+			# Rows of the same plain type share one DataSet and its accessors.
+			if reusable and type(row) is type(data_set.data):
+				data_set.data = row
+			else:
+				data_set = DataSet(row)
+				reusable = not isinstance(row, DataSet)
+
+			error = self._validate(data_set)
+			yield index, error
+
+			if error is not None:
+				failed += 1
+				if max_errors is not None and failed >= max_errors:
+					return
+
+	def _validate(self, data_set):
+		status = {}
+		results = []
+		for field in self.plan:
+			if field.should_run(status):
+				error = field.validate(data_set)
+				status[field.attribute] = error is None
+				results.append((field, error))
+		return _make_error(results)
+
+	def __call__(self, data):
+		return self.validate(data)
+
+
+def _make_error(results):
+	errors = None
+	for field, error in results:
+		if error is not None:
+			if errors is None:
+				errors = stack()
+			errors[field.attribute] = error
+
+	if errors is not None:
+		return ValidationError(errors)
+
+
+class _Columns(object):
+	"""Assembles rows (as DataSets) from a mapping of columns on demand."""
+
+	def __init__(self, columns):
+		self.columns = columns
+		self.rows = {}
+
+	def get(self, attribute, size):
+		column = self.columns.get(attribute)
+		return [NOT_PROVIDED] * size if column is None else column
+
+	def row(self, index):
+		row = self.rows.get(index)
+		if row is None:
+			row = {k : c[index] for k, c in self.columns.items()}
+			row = self.rows[index] = DataSet(row)
+		return row
+
+
+def _column_indices(field, ran, failed, size):
+	if not field.if_passes and not field.if_fails:
+		return None
+
+	names = field.if_passes + field.if_fails
+	indices = []
+	for index in range(size):
+		status = {}
+		for name in names:
+			if name in ran and (ran[name] is None or index in ran[name]):
+				status[name] = index not in failed[name]
+		if field.should_run(status):
+			indices.append(index)
+	return indices
+
+
+def _validate_column(field, table, size, indices=None):
+	values = table.get(field.attribute, size)
+	if field.clean is not _clean:
+		# Like the row path, only rows the field runs on are cleaned.
+		cleaned = list(values)
+		for i in (range(size) if indices is None else indices):
+			cleaned[i] = field.clean(values[i], field=field.definition, data=table.row(i))
+		values = cleaned
+
+	errors = []
+	pending = range(size) if indices is None else indices
+	subset = values if indices is None else None
+	for rule in field.rules:
+		if not pending:
+			break
+		indices = pending
+		if subset is None:
+			subset = _take(values, pending)
+
+		pending = []
+		if getattr(rule, 'columnar', False):
+			for index, value, ok in zip(indices, subset, rule.check_many(subset)):
+				if ok:
+					pending.append(index)
+				else:
+					errors.append((index, rule.get_error(value, table.row(index))))
+		else:
+			for index, value in zip(indices, subset):
+				try:
+					rule(value, table.row(index))
+				except ValidationError as error:
+					errors.append((index, error))
+				else:
+					pending.append(index)
+		subset = None
+	return errors
+
+
+def _get_checker(rule):
+	if isinstance(rule, rules.Rule):
+		return rule.check
+
+	def check(value, data):
+		try:
+			rule(value, data)
+		except ValidationError:
+			return False
+		return True
+	return check
+
+
+def _take(values, indices):
+	if rules._is_array(values):
+		return values[indices]
+	return [values[i] for i in indices]
+
+
+def _column_size(columns):
+	sizes = set(len(c) for c in columns.values())
+	if len(sizes) > 1:
+		raise ValueError("All columns must have the same length.")
+	return sizes.pop() if sizes else 0
+
+
+def _clean(value, **kwargs):
+	return value
+
+
+def _plan(fields):
+	"""Compile the parsed fields into stages ordered by their dependencies.
+
+	The first stage holds the unconditional fields in their original order.
+	Every later stage only holds fields whose if_passes/if_fails fields are
+	in earlier stages.
+	"""
+	pending = [CompiledField(f) for f in fields.default + fields.if_passes + fields.if_fails]
+	defaults = [f.attribute for f in fields.default]
+	for field in pending:
+		field.if_passes = _dependencies(field, field.if_passes, defaults, fields.all)
+		field.if_fails = _dependencies(field, field.if_fails, defaults, fields.all)
+
+	stages = []
+	done = set()
+	while pending:
+		stage = tuple(f for f in pending if done.issuperset(f.if_passes + f.if_fails))
+		if not stage:
+			names = ', '.join(f.attribute for f in pending)
+			raise ValueError("Circular if_passes/if_fails dependency between fields: {0}.".format(names))
+		stages.append(stage)
+		done.update(f.attribute for f in stage)
+		pending = [f for f in pending if f not in stage]
+	return tuple(stages)
+
+
+def _dependencies(field, names, defaults, known):
+	if names == '*':
+		return tuple(name for name in defaults if name != field.attribute)
+	for name in names:
+		if name not in known:
+			error = "Field '{0}' depends on unknown field '{1}'."
+			raise ValueError(error.format(field.attribute, name))
+	return tuple(names)
+
+
+def _parse_fields(field_set):
+	fields = ParsedFields(stack(), [], [], [])
+	for f in field_set:
+		if f.if_passes:
+			fields.if_passes.append(f)
+		elif f.if_fails:
+			fields.if_fails.append(f)
+		else:
+			fields.default.append(f)
+		fields.all[f.attribute] = f
+	return fields
@@ -1,3 +1,5 @@
 from .tasks import Tasks
 from .alerts import Alerts
 from .fineries import Fineries
+from .base import CallbackArgs
+from .instrumentation import Instrumentation, HookCall
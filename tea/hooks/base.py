@@ -1,10 +1,14 @@
-from tea.collections import stack, Stack
-from tea.wrapper import wrap
+import asyncio
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tea.collections import stack
+from .instrumentation import Instrumentation
 
 class Base(object):
 	"""docstring for Base"""
 	def __init__(self, feedback_handler = None, defult_level = None, default_level = None, \
-			min_level = None, max_level = None, lock_callbacks = True):
+			min_level = None, max_level = None, lock_callbacks = True, executor = None):
 		if not feedback_handler:
 			feedback_handler = self.handle_feedback
 
@@ -17,6 +21,10 @@ class Base(object):
 		self.levels.default = default_level
 		self.levels.min = min_level
 		self.levels.max = max_level
+		self.executor = executor
+		self.instrumentation = None
+		self._limits = {}
+		self._executor_lock = threading.Lock()
 
 		self._init_hooks()
 
@@ -40,11 +48,18 @@ class Base(object):
 
 	def _init_hooks(self):
 		self.hooks = stack()
-		self.hooks.setdefault(Stack.ALL_ITEMS, wrap(self.new_hook))
+		self.hooks.set_factory(self.new_hook)
+		self._dispatch = {}
+		self._dispatch_levels = {}
+		# Bumped by clear_dispatch(), so that tuples built while a bind()
+		# happened are not cached.
+		self._generations = {}
+		self._generation = 0
+		self._dispatch_lock = threading.Lock()
 
 	def new_hook(self):
 		hook = stack()
-		hook.setdefault(Stack.ALL_ITEMS, wrap(self.new_holder))
+		hook.set_factory(self.new_holder)
 		return hook
 
 	def new_holder(self):
@@ -61,30 +76,108 @@ class Base(object):
 		return hook[level]
 
 	def get_callbacks(self, key):
+		"""The (callback, args) pairs of a hook as a tuple ordered by level.
+
+		The tuple is built once and reused until a callback is bound to the
+		hook. Call clear_dispatch() after changing holders directly.
+		"""
+		callbacks = self._dispatch.get(key)
+		if callbacks is not None:
+			return callbacks
+		if key not in self.hooks:
+			return ()
+
+		generation = self._get_generation(key)
 		hook = self.get_hook(key)
 		callbacks = []
-
 		for level, holder in sorted(hook.items()):
-			callbacks.extend(holder)
+			callbacks.extend(self._dispatch_entries(key, holder))
+		callbacks = tuple(callbacks)
+		self._cache_dispatch(self._dispatch, key, callbacks, generation)
 		return callbacks
 
-	def build_callback_args(self, args, data):
-		if not args:
-			return data
-		kwargs = {}
-		if args[0] is None:
-			return kwargs
+	def get_callback_levels(self, key):
+		"""The (level, callbacks) pairs of a hook as a tuple ordered by level.
 
-		for arg in args:
-			kwargs[arg] = data[arg]
+		Cached like get_callbacks().
+		"""
+		levels = self._dispatch_levels.get(key)
+		if levels is not None:
+			return levels
+		if key not in self.hooks:
+			return ()
 
-		return kwargs
+		generation = self._get_generation(key)
+		hook = self.get_hook(key)
+		levels = tuple((level, self._dispatch_entries(key, holder))
+				for level, holder in sorted(hook.items()) if holder)
+		self._cache_dispatch(self._dispatch_levels, key, levels, generation)
+		return levels
+
+	def _get_generation(self, key):
+		return (self._generation, self._generations.get(key, 0))
+
+	def _cache_dispatch(self, cache, key, value, generation):
+		with self._dispatch_lock:
+			if self._get_generation(key) == generation:
+				cache[key] = value
+
+	def _dispatch_entries(self, key, holder):
+		instrumentation = self.instrumentation
+		if instrumentation is None:
+			return tuple(holder)
+		return tuple((instrumentation.wrap(key, callback), args) for callback, args in holder)
+
+	def instrument(self, sink = None, samples = 1000):
+		"""Start recording call counts, latencies and errors of all callbacks.
+
+		Returns the Instrumentation; see also get_stats(). Callbacks are
+		only wrapped while instrumentation is on. Instrumented callbacks
+		cannot be sent to process pools.
+		"""
+		self.instrumentation = Instrumentation(sink, samples)
+		self.clear_dispatch()
+		return self.instrumentation
 
+	def uninstrument(self):
+		self.instrumentation = None
+		self.clear_dispatch()
+
+	def get_stats(self):
+		"""A snapshot dict of the recorded statistics, empty if not instrumented."""
+		if self.instrumentation is None:
+			return {}
+		return self.instrumentation.snapshot()
+
+	def clear_dispatch(self, key=None):
+		with self._dispatch_lock:
+			if key is None:
+				self._generation += 1
+				self._dispatch.clear()
+				self._dispatch_levels.clear()
+			else:
+				self._generations[key] = self._generations.get(key, 0) + 1
+				self._dispatch.pop(key, None)
+				self._dispatch_levels.pop(key, None)
+
+	def build_callback_args(self, args, data):
+		if isinstance(args, CallbackArgs):
+			return args.select(data)
+		return _compile_select(args)(data)
+
+	def compile_callback_args(self, args):
+		"""Return a function that selects a callback's keyword arguments.
+
+		With no args all the data is passed through, with args (None,) none
+		of it and otherwise only the keys named in args.
+		"""
+		return _compile_select(args)
 
 	def bind_callback(self, hook, callback, level, args, lock, **kwargs):
 		level = self.get_level(level)
 		holder = self.get_holder(hook, level)
-		holder.append( (callback, args) )
+		holder.append( (callback, CallbackArgs(args)) )
+		self.clear_dispatch(hook)
 		return None if self.islockable(lock) else callback
 
 
@@ -107,3 +200,142 @@ class Base(object):
 
 	def fire(self, hook, *args, **kwargs):
 		pass
+
+	def get_executor(self):
+		"""The executor used by fire_in_executor().
+
+		A ThreadPoolExecutor is created on first use if none was given.
+		"""
+		if self.executor is None:
+			with self._executor_lock:
+				if self.executor is None:
+					self.executor = ThreadPoolExecutor()
+		return self.executor
+
+	def set_concurrency(self, hook, limit):
+		"""Allow at most limit callbacks of hook to run in the executor at once.
+
+		Submitting more blocks the caller until one of them finishes. Pass
+		None to remove the limit.
+		"""
+		if limit is None:
+			self._limits.pop(hook, None)
+		else:
+			self._limits[hook] = threading.BoundedSemaphore(limit)
+
+	def fire_in_executor(self, hook, wait = False, executor = None, **kwargs):
+		"""Submit the callbacks of a hook to a concurrent.futures executor.
+
+		Returns the futures in dispatch order. With wait, levels run one
+		after the other, each level concurrently, and the results are
+		returned instead. Callbacks (and their arguments) must be picklable
+		for process pools.
+		"""
+		if executor is None:
+			executor = self.get_executor()
+		limit = self._limits.get(hook)
+		if not wait:
+			return [self._submit(executor, limit, callback, args.select(kwargs))
+					for callback, args in self.get_callbacks(hook)]
+
+		results = []
+		for level, callbacks in self.get_callback_levels(hook):
+			futures = [self._submit(executor, limit, callback, args.select(kwargs))
+					for callback, args in callbacks]
+			results.extend(future.result() for future in futures)
+		return results
+
+	def _submit(self, executor, limit, callback, data):
+		if limit is None:
+			return executor.submit(callback, **data)
+
+		limit.acquire()
+		try:
+			future = executor.submit(callback, **data)
+		except BaseException:
+			limit.release()
+			raise
+		future.add_done_callback(lambda future: limit.release())
+		return future
+
+	async def _fire_async(self, hook, handler, concurrent, kwargs):
+		"""Fire a hook whose callbacks may be coroutine functions.
+
+		Firing stops once a feedback equals False. With concurrent, the
+		callbacks of each level are gathered and the feedbacks are checked
+		after the level.
+		"""
+		count = 0
+		if not concurrent:
+			for callback, args in self.get_callbacks(hook):
+				feedback = await _await(handler(await _await(callback(**args.select(kwargs)))))
+				count += 1
+				if feedback == False:
+					break
+			return count
+
+		for level, callbacks in self.get_callback_levels(hook):
+			results = await asyncio.gather(
+				*(_await(callback(**args.select(kwargs))) for callback, args in callbacks))
+			stop = False
+			for result in results:
+				if await _await(handler(result)) == False:
+					stop = True
+			count += len(results)
+			if stop:
+				break
+		return count
+
+
+class CallbackArgs(tuple):
+	"""The argument names a callback was bound with.
+
+	select(data) returns the callback's keyword arguments, using a function
+	specialised for the names when the callback is bound.
+	"""
+
+	def __new__(cls, args=()):
+		self = super(CallbackArgs, cls).__new__(cls, args)
+		self.select = _compile_select(self)
+		return self
+
+
+def _compile_select(args):
+	if not args:
+		return _passthrough
+	if args[0] is None:
+		return _no_args
+
+	# Dict displays for the common short lists build the kwargs without
+	# looping over the names.
+	if len(args) == 1:
+		a, = args
+		return lambda data: {a : data[a]}
+	if len(args) == 2:
+		a, b = args
+		return lambda data: {a : data[a], b : data[b]}
+	if len(args) == 3:
+		a, b, c = args
+		return lambda data: {a : data[a], b : data[b], c : data[c]}
+
+	names = tuple(args)
+	def select(data):
+		kwargs = {}
+		for name in names:
+			kwargs[name] = data[name]
+		return kwargs
+	return select
+
+
+async def _await(result):
+	if inspect.isawaitable(result):
+		result = await result
+	return result
+
+
+def _passthrough(data):
+	return data
+
+
+def _no_args(data):
+	return {}
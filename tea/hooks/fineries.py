@@ -8,7 +8,7 @@ class Fineries(base.Base):
 		callbacks = self.get_callbacks(hook)
 		count = 0
 		for callback, args in callbacks:
-			data = self.build_callback_args(args, kwargs)
+			data = args.select(kwargs)
 			value = handler( callback( value, **data ) )
 			count += 1
 
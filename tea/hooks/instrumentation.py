@@ -0,0 +1,147 @@
+import collections
+import inspect
+import threading
+import time
+from tea.collections import record
+
+HookCall = record('HookCall', ['hook', 'callback', 'elapsed', 'error'])
+
+
+class Instrumentation(object):
+	"""Collects call counts, latencies and errors of hook callbacks.
+
+	Latencies are in seconds. Percentiles are computed over the last
+	`samples` calls of each callback. A sink, if given, is called with a
+	HookCall record after every callback call.
+	"""
+
+	def __init__(self, sink=None, samples=1000):
+		self.sink = sink
+		self.samples = samples
+		self._stats = {}
+		self._lock = threading.Lock()
+
+	def wrap(self, hook, callback):
+		"""Return callback wrapped so that its calls are recorded."""
+		record_call = self.record
+		clock = time.perf_counter
+
+		def timed(*args, **kwargs):
+			start = clock()
+			try:
+				result = callback(*args, **kwargs)
+			except Exception as error:
+				record_call(hook, callback, clock() - start, error)
+				raise
+			if inspect.isawaitable(result):
+				return self._timed_await(hook, callback, start, result)
+			record_call(hook, callback, clock() - start)
+			return result
+
+		timed.__wrapped__ = callback
+		return timed
+
+	async def _timed_await(self, hook, callback, start, awaitable):
+		try:
+			result = await awaitable
+		except Exception as error:
+			self.record(hook, callback, time.perf_counter() - start, error)
+			raise
+		self.record(hook, callback, time.perf_counter() - start)
+		return result
+
+	def record(self, hook, callback, elapsed, error=None):
+		with self._lock:
+			stats = self._stats.get((hook, callback))
+			if stats is None:
+				stats = self._stats[(hook, callback)] = _Stats(self.samples)
+			stats.add(elapsed, error)
+		if self.sink is not None:
+			self.sink(HookCall(hook, callback, elapsed, error))
+
+	def snapshot(self):
+		"""Return the statistics as a dict of hooks.
+
+		Each hook maps to its totals over all its callbacks and to a
+		'callbacks' dict with the same figures for each callback by name.
+		"""
+		with self._lock:
+			stats = [(hook, callback, s.copy()) for (hook, callback), s in self._stats.items()]
+
+		hooks = {}
+		totals = {}
+		for hook, callback, s in stats:
+			if hook not in hooks:
+				hooks[hook] = {'callbacks' : {}}
+				totals[hook] = _Stats(None)
+			callbacks = hooks[hook]['callbacks']
+			name = _callback_name(callback)
+			if name in callbacks:
+				name = '{0}#{1}'.format(name, len(callbacks))
+			callbacks[name] = s.to_dict()
+			totals[hook].merge(s)
+
+		for hook, total in totals.items():
+			hooks[hook].update(total.to_dict())
+		return hooks
+
+	def reset(self):
+		with self._lock:
+			self._stats.clear()
+
+
+class _Stats(object):
+	__slots__ = ('calls', 'errors', 'total', 'latencies', 'last_error')
+
+	def __init__(self, samples):
+		self.calls = 0
+		self.errors = 0
+		self.total = 0.0
+		self.latencies = collections.deque(maxlen=samples)
+		self.last_error = None
+
+	def add(self, elapsed, error=None):
+		self.calls += 1
+		self.total += elapsed
+		self.latencies.append(elapsed)
+		if error is not None:
+			self.errors += 1
+			self.last_error = error
+
+	def merge(self, other):
+		self.calls += other.calls
+		self.errors += other.errors
+		self.total += other.total
+		self.latencies.extend(other.latencies)
+		if other.last_error is not None:
+			self.last_error = other.last_error
+
+	def copy(self):
+		stats = _Stats(self.latencies.maxlen)
+		stats.merge(self)
+		return stats
+
+	def to_dict(self):
+		latencies = sorted(self.latencies)
+		return {
+			'calls' : self.calls,
+			'errors' : self.errors,
+			'total' : self.total,
+			'p50' : _percentile(latencies, 50),
+			'p99' : _percentile(latencies, 99),
+			'last_error' : self.last_error,
+		}
+
+
+def _percentile(values, percent):
+	"""Nearest-rank percentile of sorted values, None if there are none."""
+	if not values:
+		return None
+	rank = -(-len(values) * percent // 100)
+	return values[max(rank, 1) - 1]
+
+
+def _callback_name(callback):
+	module = getattr(callback, '__module__', None)
+	name = getattr(callback, '__qualname__', None) or repr(callback)
+	return '{0}.{1}'.format(module, name) if module else name
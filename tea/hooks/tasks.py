@@ -11,9 +11,18 @@ class Tasks(base.Base):
 		callbacks = self.get_callbacks(hook)
 		count = 0
 		for callback, args in callbacks:
-			data = self.build_callback_args(args, kwargs)
+			data = args.select(kwargs)
 			feedback = handler( callback( **data ) )
 			count += 1
 			if feedback == False:
 				break
-		return count
\ No newline at end of file
+		return count
+
+	async def fire_async(self, hook, feedback_handler = None, concurrent = False, **kwargs):
+		"""Like fire() but awaits coroutine callbacks.
+
+		With concurrent, callbacks of the same level run together through
+		asyncio.gather().
+		"""
+		handler = self.get_feedback_handler(feedback_handler)
+		return await self._fire_async(hook, handler, concurrent, kwargs)
@@ -1,9 +1,11 @@
+import re
 import unittest
 from nose.tools import raises
 from tea import uzi
 from tea.collections import Stack
 from tea.gap import ValidationError
 from nose_parameterized import parameterized
+from tea.gap import rules
 from tea.gap.rules import (
 	Rule, Required, Regex, Url, Email, Integer, IPv4, IPv6, IP,
 	Min, Max, MaxLen, MinLen, Length, Passes, Fails, Equals,
@@ -93,6 +95,11 @@ class RulesTest(unittest.TestCase):
 		rule = DummyRule()
 		rule.validate(False)
 
+	def test_is_valid(self):
+		rule = DummyRule()
+		self.assertTrue(rule.is_valid('foo'))
+		self.assertFalse(rule.is_valid(False))
+
 	def test_rule_is_callable(self):
 		rule = DummyRule()
 		self.assertIsNone(rule('foo'))
@@ -214,18 +221,60 @@ class RulesTest(unittest.TestCase):
 		result = rule.check(value)
 		self.assertEqual(expected, result)
 
+	def test_regex_patterns_are_shared(self):
+		pattern = r'^shared-[0-9]+$'
+		info = rules.compile_regex.cache_info()
+		regex = rules.compile_regex(pattern)
+		self.assertIs(regex, Regex(pattern).regex)
+		self.assertIs(regex, rules.compile_regex(pattern, 0))
+		after = rules.compile_regex.cache_info()
+		self.assertEqual(info.misses + 1, after.misses)
+		self.assertEqual(info.hits + 2, after.hits)
+		self.assertIsNot(regex, Regex(pattern, flags=re.I).regex)
+		self.assertEqual(after.misses + 1, rules.compile_regex.cache_info().misses)
+
 	@parameterized.expand([
 			(False, 'abc'),
 			(False, '127.0.0.1'),
 			(False, 'http://127.0.0.1', ('https',)),
 			(True, 'http://127.0.0.1'),
 			(True, 'http://localhost:8080'),
+			(True, 'http://example.com\n'),
+			(True, 'http://example.com/a\tb'),
+			(False, 'http://example.com/a b'),
 			(True, '', None, True),
 			(True, 'https://www.google.com/search?q=foo+bar&oq=foo+bar&aqs=chrome..69i57.229035j0j7&sourceid=chrome&ie=UTF-8'),
 		])
 	def test_url(self, expected, value, schemes=None, ignore_empty=None, kwargs={}):
 		rule = Url(schemes=schemes, ignore_empty=ignore_empty, **kwargs)
 		self.assertEqual(expected, rule.check(value))
+		rule = Url(schemes=schemes, ignore_empty=ignore_empty, single_pass=True, **kwargs)
+		self.assertEqual(expected, rule.check(value))
+
+	@parameterized.expand([
+			('idn', 'http://bücher.de/straße?q=1'),
+			('idn with port', 'https://例え.テスト:8443/'),
+			('bad idn', 'http://exámple..com'),
+			('ipv6', 'http://[fe80::1]:8080/index'),
+			('ftp', 'ftp://ftp.example.org'),
+			('trailing dot', 'http://example.com./a'),
+			('spaces', 'http://example.com/a b'),
+			('question mark', 'http://example.com?'),
+			('userinfo', 'http://user@example.com'),
+			('dash', 'http://-example.com'),
+			('no host', 'http:///path'),
+			('trailing newline', 'http://example.com\n'),
+			('tab', 'http://exa\tmple.com/a'),
+			('empty authority', 'http:////example.com/a'),
+			('empty idn authority', 'http:////bücher.de'),
+			('many labels', 'http://a.b-c.d.e1.fg:80/'),
+			('bad label', 'http://a.-b.com'),
+			('short tld', 'http://example.c'),
+			('ipv4 like', 'http://999.1.1.1'),
+			('hex port', 'http://abc:12'),
+		])
+	def test_url_single_pass_matches_regex(self, _, value):
+		self.assertEqual(Url().check(value), Url(single_pass=True).check(value))
 
 	@parameterized.expand([
 			(True, 'mail_25@example.com'),
@@ -245,6 +294,21 @@ class RulesTest(unittest.TestCase):
 		rule = Email(**kwargs)
 		self.assertEqual(expected, rule.check(value))
 
+	def test_email_caches_domain_verdicts(self):
+		rule = Email(domain_cache_size=2)
+		self.assertTrue(rule.check('a@example.com'))
+		self.assertTrue(rule.check('b@example.com'))
+		self.assertTrue(rule.check('c@bücher.de'))
+		self.assertFalse(rule.check('d@example'))
+		self.assertEqual(2, len(rule.domain_cache))
+		self.assertEqual(1, rule.domain_cache.hits)
+		self.assertIs(Email().domain_cache, Email().domain_cache)
+
+	def test_email_check_many(self):
+		rule = Email(ignore_empty=True)
+		values = ['a@example.com', 'b(1)@example.com', 'c@example', '', 'd@bücher.de', 'e@localhost', 'f']
+		self.assertEqual([rule.check(v) for v in values], rule.check_many(values))
+
 	@parameterized.expand([
 			(True, '127.0.0.1'),
 			(True, '', dict(ignore_empty=True)),
@@ -318,3 +382,39 @@ class RulesTest(unittest.TestCase):
 		rule = Fails(condition, args=('foo',))
 		self.assertTrue(rule.check('bar'))
 		self.assertFalse(rule.check('foo'))
+
+
+class CheckManyTest(unittest.TestCase):
+
+	@parameterized.expand([
+			('required', Required(), ['abc', 0, '', None, False]),
+			('integer', Integer(), [20, '20', 23.5, '23i', {}]),
+			('max', Max(20), [10, 20, 30]),
+			('min', Min(20), [10, 20, 30]),
+			('maxlen', MaxLen(3), ['fo', 'foo', 'foobar']),
+			('minlen', MinLen(3, ignore_empty=True), ['fo', 'foo', '', 'foobar']),
+			('length', Length(3), ['fo', 'foo', 'foobar']),
+			('regex', Regex(r'^[a-z]+\d+$'), ['abc123', 'abc', '']),
+			('url', Url(), ['http://localhost:8080', 'abc']),
+			('email', Email(), ['mail@example.com', 'mail@example']),
+		])
+	def test_check_many_matches_check(self, _, rule, values):
+		expected = [rule.check(v) for v in values]
+		self.assertEqual(expected, list(rule.check_many(values)))
+
+	@parameterized.expand([
+			('required', Required(), [1, 0, 5]),
+			('integer', Integer(), [1, 0, 5]),
+			('integer floats', Integer(), [1.0, 0.5]),
+			('max', Max(20), [10, 20, 30]),
+			('min', Min(20.5), [10.0, 20.5, 30.0]),
+			('maxlen', MaxLen(3), ['fo', 'foo', 'foobar']),
+			('minlen', MinLen(3, ignore_empty=True), ['fo', 'foo', '', 'foobar']),
+			('length', Length(3), ['fo', 'foo', 'foobar']),
+			('regex', Regex(r'^[a-z]+\d+$'), ['abc123', 'abc', '']),
+		])
+	@unittest.skipIf(rules.numpy is None, 'NumPy is not installed.')
+	def test_check_many_with_numpy(self, _, rule, values):
+		expected = [rule.check(v) for v in values]
+		result = rule.check_many(rules.numpy.array(values))
+		self.assertEqual(expected, [bool(v) for v in result])
@@ -1,11 +1,13 @@
+import asyncio
+import time
 import unittest
 from nose.tools import raises
 from tea import uzi
 from tea.collections import Stack
-from tea.gap import ValidationError, validate, field
+from tea.gap import ValidationError, Schema, validate, validate_many, validate_async, is_valid, field, compile
 from nose_parameterized import parameterized
 from tea.gap.rules import (
-	Rule, Required, Regex, Url, Email, Integer, IPv4, IPv6, IP, Same,
+	Rule, Required, Regex, Url, Email, Integer, IPv4, IPv6, IP, Same, Min, MinLen, Passes, Fails,
 	EMPTY, NOTHING, NOT_PROVIDED,
 	EMPTY_VALUES, EMPTY_COLLECTIONS, EMPTY_VALUES_AND_COLLECTIONS)
 
@@ -30,6 +32,204 @@ class ValidationTest(unittest.TestCase):
 		print('')
 		print(errors.format("<li>{message}</li>"))
 
+	def test_compile_returns_reusable_schema(self):
+		schema = compile([
+			field('name', Required),
+			field('email', Required, Email),
+		])
+		self.assertIsInstance(schema, Schema)
+		self.assertIs(schema, compile(schema))
+		self.assertIsNone(schema.validate({'name' : 'Foo', 'email' : 'foo@example.com'}))
+
+		errors = schema.validate({'name' : '', 'email' : 'foo@example'})
+		self.assertIsInstance(errors, ValidationError)
+		self.assertTrue(errors.has('name'))
+		self.assertTrue(errors.has('email'))
+
+		errors = validate(schema, {'name' : 'Foo', 'email' : ''})
+		self.assertFalse(errors.has('name'))
+		self.assertTrue(errors.has('email'))
+
+	def test_field_definition(self):
+		definition = field('first_name', Required, if_passes='email')
+		self.assertEqual('first_name', definition.attribute)
+		self.assertEqual('First Name', definition['display_name'])
+		self.assertEqual(['email'], definition.if_passes)
+		self.assertIsNone(definition.if_fails)
+		self.assertEqual((Required,), definition.rules)
+
+	def test_compile_resolves_rules_once(self):
+		schema = compile([field('first_name', Required)])
+		rule, = schema.default[0].rules
+		self.assertIsInstance(rule, Required)
+		self.assertEqual('First Name', rule.get_name_placeholder())
+		schema.validate({})
+		self.assertIs(rule, schema.default[0].rules[0])
+
+	def test_validate_many(self):
+		rules = [field('name', Required), field('email', Required, Email)]
+		rows = [
+			{'name' : 'Foo', 'email' : 'foo@example.com'},
+			{'name' : '', 'email' : 'foo@example.com'},
+			{'name' : 'Bar', 'email' : 'bar@example'},
+		]
+		results = list(validate_many(rules, rows))
+		self.assertEqual([0, 1, 2], [i for i, e in results])
+		self.assertIsNone(results[0][1])
+		self.assertTrue(results[1][1].has('name'))
+		self.assertFalse(results[1][1].has('email'))
+		self.assertTrue(results[2][1].has('email'))
+
+	def test_validate_many_with_max_errors(self):
+		rows = ({'name' : v} for v in ('a', '', 'b', '', ''))
+		results = list(validate_many([field('name', Required)], rows, max_errors=2))
+		self.assertEqual(4, len(results))
+		self.assertEqual([1, 3], [i for i, e in results if e is not None])
+
+	def test_validate_many_with_columns(self):
+		rules = [
+			field('name', Required, MinLen(3)),
+			field('age', Integer, Min(18)),
+			field('pass', Same('confirm')),
+		]
+		rows = [
+			{'name' : 'Foo', 'age' : 20, 'pass' : 'a', 'confirm' : 'a'},
+			{'name' : '', 'age' : 15, 'pass' : 'a', 'confirm' : 'b'},
+			{'name' : 'Fo', 'age' : 'x', 'pass' : 'a', 'confirm' : 'a'},
+		]
+		columns = {k : [r[k] for r in rows] for k in rows[0]}
+		expected = [(i, e and e.messages) for i, e in validate_many(rules, rows)]
+		result = [(i, e and e.messages) for i, e in validate_many(rules, columns)]
+		self.assertEqual(expected, result)
+		self.assertEqual(2, len(list(validate_many(rules, columns, max_errors=1))))
+
+	def test_columns_use_overridden_checks(self):
+		class Lowercase(Regex):
+			regex = '^[a-z]+$'
+
+			def check(self, value, data_set=None):
+				return value != 'admin' and super(Lowercase, self).check(value, data_set)
+
+		class Positive(Min):
+			def check(self, value, data_set=None):
+				return value != 13 and super(Positive, self).check(value, data_set)
+
+		class Matches(Regex):
+			def check(self, value, data_set=None):
+				return value == data_set.get('u')
+
+		self.assertIs(Rule.check_many, Lowercase.check_many)
+		self.assertIs(Regex.check_many, type('Plain', (Regex,), {}).check_many)
+		self.assertFalse(type('Plain', (Regex,), {}).columnar)
+
+		rules = [field('u', Lowercase), field('n', Positive(0)), field('m', Matches)]
+		rows = [{'u' : 'admin', 'n' : 13, 'm' : 'x'}, {'u' : 'bob', 'n' : 1, 'm' : 'bob'}]
+		columns = {k : [r[k] for r in rows] for k in rows[0]}
+		expected = [(i, e and e.messages) for i, e in validate_many(rules, rows)]
+		self.assertEqual(['u', 'n', 'm'], list(expected[0][1]))
+		self.assertIsNone(expected[1][1])
+		self.assertEqual(expected, [(i, e and e.messages) for i, e in validate_many(rules, columns)])
+
+	def test_is_valid(self):
+		calls = []
+		def condition(value, data):
+			calls.append(value)
+			return True
+		rules = [field('name', Required), field('other', Passes(condition))]
+		self.assertTrue(is_valid(rules, {'name' : 'Foo', 'other' : 'x'}))
+		self.assertFalse(is_valid(rules, {'name' : '', 'other' : 'y'}))
+		self.assertEqual(['x'], calls)
+
+	def test_validate_async(self):
+		async def exists(value, data):
+			await asyncio.sleep(0.05)
+			return value == 'taken'
+
+		rules = [field('f%d' % i, Required, Fails(exists)) for i in range(5)]
+		rules.append(field('other', Passes(exists)))
+		data = {'f%d' % i : 'free' for i in range(5)}
+		data['f0'] = 'taken'
+		data['other'] = 'free'
+
+		start = time.perf_counter()
+		errors = asyncio.run(validate_async(rules, data))
+		self.assertLess(time.perf_counter() - start, 0.25)
+		self.assertTrue(errors.has('f0'))
+		self.assertFalse(errors.has('f1'))
+		self.assertTrue(errors.has('other'))
+
+	def test_validate_async_with_sync_rules(self):
+		rules = [field('name', Required), field('email', Email)]
+		self.assertIsNone(asyncio.run(validate_async(rules, {'name' : 'Foo', 'email' : 'foo@example.com'})))
+
+	def _conditional_rules(self, calls):
+		def lookup(value, data):
+			calls.append(value)
+			return value == 'ok'
+		return [
+			field('lookup', Passes(lookup), if_passes=['username', 'email']),
+			field('username', Required),
+			field('email', Required, Email),
+			field('reason', Required, if_fails='email'),
+			field('audit', Passes(lookup), if_passes='lookup'),
+		]
+
+	def test_conditional_fields_are_skipped(self):
+		calls = []
+		rules = self._conditional_rules(calls)
+		errors = validate(rules, {'username' : 'foo', 'email' : 'bad', 'lookup' : 'ok'})
+		self.assertEqual([], calls)
+		self.assertEqual(['email', 'reason'], list(errors.message_dict.keys()))
+
+		errors = validate(rules, {'username' : 'foo', 'email' : 'foo@example.com', 'lookup' : 'no', 'audit' : 'ok'})
+		self.assertEqual(['no'], calls)
+		self.assertEqual(['lookup'], list(errors.message_dict.keys()))
+
+		data = {'username' : 'foo', 'email' : 'foo@example.com', 'lookup' : 'ok', 'audit' : 'ok'}
+		self.assertIsNone(validate(rules, data))
+		self.assertTrue(is_valid(rules, data))
+		self.assertIsNone(asyncio.run(validate_async(rules, data)))
+
+	def test_conditional_fields_are_ordered_in_stages(self):
+		schema = compile(self._conditional_rules([]))
+		self.assertEqual(
+			[['username', 'email'], ['lookup', 'reason'], ['audit']],
+			[[f.attribute for f in stage] for stage in schema.stages])
+
+	def test_conditional_fields_with_columns_and_clean(self):
+		rules = [
+			field('a', Required),
+			field('b', Min(3), if_passes='a', clean=lambda v, **kwargs: v * 2),
+		]
+		rows = [{'a' : None, 'b' : None}, {'a' : 1, 'b' : 1}, {'a' : 1, 'b' : 2}]
+		columns = {k : [r[k] for r in rows] for k in rows[0]}
+		expected = [(i, e and e.messages) for i, e in validate_many(rules, rows)]
+		result = [(i, e and e.messages) for i, e in validate_many(rules, columns)]
+		self.assertEqual(['a'], list(expected[0][1]))
+		self.assertEqual(['b'], list(expected[1][1]))
+		self.assertIsNone(expected[2][1])
+		self.assertEqual(expected, result)
+
+	def test_conditional_fields_with_columns(self):
+		rules = self._conditional_rules([])
+		rows = [
+			{'username' : 'foo', 'email' : 'bad', 'lookup' : 'ok', 'reason' : '', 'audit' : 'ok'},
+			{'username' : 'foo', 'email' : 'foo@example.com', 'lookup' : 'no', 'reason' : '', 'audit' : 'no'},
+			{'username' : 'foo', 'email' : 'foo@example.com', 'lookup' : 'ok', 'reason' : '', 'audit' : 'ok'},
+		]
+		columns = {k : [r[k] for r in rows] for k in rows[0]}
+		expected = [(i, e and e.messages) for i, e in validate_many(rules, rows)]
+		result = [(i, e and e.messages) for i, e in validate_many(rules, columns)]
+		self.assertEqual(expected, result)
+
+	@raises(ValueError)
+	def test_circular_conditions(self):
+		compile([field('a', Required, if_passes='b'), field('b', Required, if_fails='a')])
+
+	@raises(ValueError)
+	def test_unknown_condition(self):
+		compile([field('a', Required, if_passes='b')])
+
 
 def dummy_ruleset():
 	pass
\ No newline at end of file
@@ -0,0 +1,541 @@
+import array
+import gc
+import pickle
+import threading
+import unittest
+from tea.collections import (
+	Stack, stack, Record, record, FrozenStack, ConcurrentStack,
+	UniqueAppender, BloomFilter, unique_list, iter_unique,
+	to_list, to_sequence, ensure_iterable, IndexedStack)
+from tea.wrapper import wrap
+
+
+class Colliding(object):
+	def __init__(self, name):
+		self.name = name
+
+	def __hash__(self):
+		return 42
+
+	def __eq__(self, other):
+		return isinstance(other, Colliding) and other.name == self.name
+
+Point = record('Point', 'x y z', dict(z=0))
+
+
+class StackTest(unittest.TestCase):
+
+	def test_keeps_insertion_order(self):
+		st = stack(b=2, a=1)
+		st.c = 3
+		st['b'] = 20
+		del st['a']
+		st.a = 10
+		self.assertEqual(['b', 'c', 'a'], st.keys())
+		self.assertEqual([20, 3, 10], st.values())
+		self.assertEqual([('b', 20), ('c', 3), ('a', 10)], st.items())
+
+	def test_has_key(self):
+		st = stack(a=None)
+		self.assertTrue(st._has_key('a'))
+		self.assertFalse(st._has_key('b'))
+		self.assertIsNone(st.a)
+		with self.assertRaises(KeyError):
+			st.b
+
+	def test_create_from_many_sources(self):
+		st = Stack({'a' : 1}, [('b', 2)], stack(c=3), FrozenStack(d=4), e=5)
+		self.assertEqual(['a', 'b', 'c', 'd', 'e'], st.keys())
+		self.assertEqual(list(range(1, 6)), st.values())
+
+	def test_factory(self):
+		calls = []
+		st = stack(a=1)
+		st.set_factory(lambda: calls.append(1) or [])
+		self.assertTrue(st.has_default())
+		self.assertEqual(1, st.a)
+		self.assertEqual([], st.b)
+		st['b'].append(2)
+		self.assertEqual([2], st.b)
+		self.assertIsNone(st.get('c'))
+		self.assertNotIn('c', st)
+		self.assertEqual(1, len(calls))
+		st.set_factory(None)
+		with self.assertRaises(KeyError):
+			st.c
+
+	def test_get_default_keeps_stored_kwargs(self):
+		st = stack()
+		st.__default__ = (wrap(lambda **kw: kw), False, {'a' : 1})
+		self.assertEqual({'a' : 1, 'b' : 2}, st.get_default(b=2))
+		self.assertEqual({'a' : 1}, st.get_default())
+
+	def test_from_items(self):
+		st = Stack.from_items(('key_%d' % i, i) for i in range(100))
+		self.assertIsInstance(st, Stack)
+		self.assertEqual(100, len(st))
+		self.assertEqual(99, st.key_99)
+		self.assertEqual(['a'], Stack.from_items({'a' : 1}).keys())
+
+	def test_update(self):
+		st = stack(a=1)
+		st.update({'b' : 2}, [('a', 10)], c=3)
+		self.assertEqual([('a', 10), ('b', 2), ('c', 3)], st.items())
+
+	def test_update_calls_overridden_setitem(self):
+		class Upper(Stack):
+			def __setitem__(self, key, value):
+				super(Upper, self).__setitem__(key.upper(), value)
+
+		st = Upper({'a' : 1}, [('b', 2)], c=3)
+		self.assertEqual(['A', 'B', 'C'], st.keys())
+
+	def test_delete_missing_key(self):
+		with self.assertRaises(KeyError):
+			del stack()['a']
+
+	def test_pickle(self):
+		st = pickle.loads(pickle.dumps(stack(a=1, b=2)))
+		self.assertIsInstance(st, Stack)
+		self.assertEqual(['a', 'b'], st.keys())
+
+
+class RecordTest(unittest.TestCase):
+
+	def test_create(self):
+		point = Point(1, y=2)
+		self.assertIsInstance(point, Record)
+		self.assertEqual((1, 2, 0), (point.x, point['y'], point.get('z')))
+		self.assertEqual(['x', 'y', 'z'], point.keys())
+		self.assertEqual([('x', 1), ('y', 2), ('z', 0)], point.items())
+		self.assertEqual(Point(1, 2, 0), point)
+		self.assertIsNone(Point().x)
+
+	def test_set(self):
+		point = Point(1, 2)
+		point.x = 10
+		point['y'] = 20
+		self.assertEqual([10, 20, 0], point.values())
+
+	def test_only_holds_declared_fields(self):
+		point = Point()
+		self.assertFalse(hasattr(point, '__dict__'))
+		self.assertIsNone(point.get('keys'))
+		self.assertNotIn('w', point)
+		with self.assertRaises(AttributeError):
+			point.w = 1
+		with self.assertRaises(KeyError):
+			point['w']
+		with self.assertRaises(TypeError):
+			Point(w=1)
+		with self.assertRaises(TypeError):
+			Point(1, 2, 3, 4)
+
+	def test_invalid_field_names(self):
+		for fields in (['get', 'x'], ['to_dict'], ['x', 'x'], ['_x'], ['class'], ['1x'], ['a-b'], [1]):
+			with self.assertRaises(ValueError):
+				record('Invalid', fields)
+		self.assertEqual(['keys_', 'x'], record('Valid', 'keys_, x')(1, 2).keys())
+
+	def test_pickle(self):
+		point = pickle.loads(pickle.dumps(Point(1, 2)))
+		self.assertEqual(Point(1, 2), point)
+
+
+class FrozenStackTest(unittest.TestCase):
+
+	def test_create(self):
+		st = FrozenStack({'a' : 1}, [('b', 2)], c=3)
+		self.assertEqual(3, len(st))
+		self.assertEqual(1, st['a'])
+		self.assertEqual(2, st.b)
+		self.assertEqual(3, st.get('c'))
+		self.assertIsNone(st.get('d'))
+		self.assertEqual({'a' : 1, 'b' : 2, 'c' : 3}, dict(st.items()))
+		self.assertEqual(dict(a=1, b=2, c=3), st)
+
+	def test_set_returns_new_version(self):
+		base = FrozenStack(a=1, b=2)
+		derived = base.set('c', 3).set('a', 10)
+		self.assertEqual(dict(a=1, b=2), base)
+		self.assertEqual(dict(a=10, b=2, c=3), derived)
+		self.assertIs(base, base.set('a', 1))
+
+	def test_delete(self):
+		base = FrozenStack(a=1, b=2)
+		self.assertEqual(dict(b=2), base.delete('a'))
+		self.assertEqual(dict(a=1, b=2), base)
+		self.assertEqual(0, len(base.delete('a').delete('b')))
+		with self.assertRaises(KeyError):
+			base.delete('c')
+
+	def test_merge(self):
+		defaults = FrozenStack(a=1, b=2)
+		layered = defaults.merge({'b' : 20}, c=30)
+		self.assertEqual(dict(a=1, b=20, c=30), layered)
+		self.assertIs(defaults, FrozenStack().merge(defaults))
+
+	def test_keeps_insertion_order(self):
+		keys = ['key_%d' % i for i in range(100, 0, -1)]
+		st = FrozenStack((key, i) for i, key in enumerate(keys))
+		self.assertEqual(keys, st.keys())
+		st = st.set('key_100', 'first').delete('key_50').set('key_50', 'last').set('new', 0)
+		self.assertEqual(keys[:50] + keys[51:] + ['key_50', 'new'], list(st))
+		self.assertEqual(('key_100', 'first'), st.items()[0])
+		self.assertEqual(['key_50', 'new'], st.to_stack().keys()[-2:])
+		self.assertEqual("FrozenStack({'b': 1, 'a': 2})", repr(FrozenStack(b=1, a=2)))
+		collided = [Colliding(i) for i in (3, 1, 2)]
+		self.assertEqual(collided, FrozenStack((k, 0) for k in collided).keys())
+
+	def test_is_immutable(self):
+		st = FrozenStack(a=1)
+		with self.assertRaises(AttributeError):
+			st.a = 2
+		with self.assertRaises(AttributeError):
+			del st.a
+		with self.assertRaises(TypeError):
+			st['a'] = 2
+
+	def test_hashable(self):
+		self.assertEqual(hash(FrozenStack(a=1, b=2)), hash(FrozenStack(b=2, a=1)))
+		self.assertEqual(1, len({FrozenStack(a=1), FrozenStack(a=1)}))
+
+	def test_hash_collisions(self):
+		keys = [Colliding(i) for i in range(5)]
+		st = FrozenStack((k, i) for i, k in enumerate(keys))
+		self.assertEqual(5, len(st))
+		self.assertEqual(3, st[Colliding(3)])
+		st = st.delete(Colliding(3)).set(Colliding(0), 'zero')
+		self.assertNotIn(Colliding(3), st)
+		self.assertEqual('zero', st[Colliding(0)])
+		self.assertEqual(4, len(st))
+
+	def test_many_keys(self):
+		items = dict(('key_%d' % i, i) for i in range(2000))
+		st = FrozenStack(items)
+		for i in range(0, 2000, 2):
+			st = st.delete('key_%d' % i)
+		self.assertEqual(1000, len(st))
+		self.assertEqual(dict((k, v) for k, v in items.items() if v % 2), dict(st.items()))
+
+	def test_pickle(self):
+		st = FrozenStack(a=1, b=2)
+		self.assertEqual(st, pickle.loads(pickle.dumps(st)))
+
+
+class ConcurrentStackTest(unittest.TestCase):
+
+	def test_mapping(self):
+		st = ConcurrentStack({'a' : 1}, b=2)
+		st.c = 3
+		st['d'] = 4
+		del st.a
+		self.assertEqual(['b', 'c', 'd'], st.keys())
+		self.assertEqual(2, st.b)
+		self.assertEqual(3, st.setdefault('c', 30))
+		self.assertEqual(5, st.setdefault('e', 5))
+		self.assertEqual(5, st.pop('e'))
+		self.assertEqual(dict(b=2, c=3, d=4), st)
+		with self.assertRaises(AttributeError):
+			st.a
+
+	def test_snapshot_is_stable(self):
+		st = ConcurrentStack(a=1)
+		snapshot = st.snapshot()
+		st.b = 2
+		self.assertEqual({'a' : 1}, dict(snapshot))
+		with self.assertRaises(TypeError):
+			snapshot['c'] = 3
+
+	def _run(self, *targets):
+		threads = [threading.Thread(target=t) for t in targets]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+
+	def test_concurrent_writes_are_not_lost(self):
+		st = ConcurrentStack()
+
+		def writer(n):
+			def write():
+				for i in range(200):
+					st['%d-%d' % (n, i)] = i
+					st.setdefault('shared', n)
+			return write
+
+		self._run(*[writer(n) for n in range(16)])
+		self.assertEqual(16 * 200 + 1, len(st))
+
+	def test_readers_never_see_partial_updates(self):
+		st = ConcurrentStack(a=0, b=0)
+		errors = []
+		done = threading.Event()
+
+		def write():
+			for i in range(2000):
+				st.update(a=i, b=i)
+			done.set()
+
+		def read():
+			while not done.is_set():
+				snapshot = st.snapshot()
+				if snapshot['a'] != snapshot['b']:
+					errors.append((snapshot['a'], snapshot['b']))
+
+		self._run(write, *[read for n in range(8)])
+		self.assertEqual([], errors)
+		self.assertEqual(1999, st.a)
+
+
+class Item(object):
+	def __init__(self, value):
+		self.value = value
+
+
+class UniqueAppenderTest(unittest.TestCase):
+
+	def test_identity(self):
+		a, b = [1], [1]
+		appender = UniqueAppender()
+		appender.append(a, b, a)
+		self.assertEqual(2, len(appender.data))
+		self.assertIs(a, appender.data[0])
+
+	def test_value(self):
+		appender = UniqueAppender(set(), by='value')
+		appender.append('a', 'b', 'a')
+		self.assertEqual({'a', 'b'}, appender.data)
+
+	def test_key_function(self):
+		appender = UniqueAppender(by=str.lower)
+		appender.append('a', 'A', 'b')
+		self.assertEqual(['a', 'b'], list(appender))
+
+	def test_weakref_forgets_collected_items(self):
+		appender = UniqueAppender(data=[], by='weakref')
+		item = Item(1)
+		appender.append(item, item)
+		self.assertEqual(1, len(appender._unique))
+		appender.data.clear()
+		del item
+		gc.collect()
+		self.assertEqual(0, len(appender._unique))
+
+	def test_weakref_holds_unreferenceable_items(self):
+		appender = UniqueAppender(by='weakref')
+		item = {'a' : 1}
+		appender.append(item, {'a' : 1}, item, [1], 'x', 1)
+		self.assertEqual([item, {'a' : 1}, [1], 'x', 1], appender.data)
+		self.assertEqual(5, len(appender._unique))
+
+	def test_window(self):
+		appender = UniqueAppender(by='value', window=2)
+		appender.append('a', 'b', 'a', 'c', 'b', 'a')
+		self.assertEqual(['a', 'b', 'c', 'b', 'a'], appender.data)
+
+	def test_bloom_filter(self):
+		appender = UniqueAppender(by='value', capacity=1000, error_rate=0.001)
+		appender.append(*range(500))
+		appender.append(*range(500))
+		self.assertLessEqual(len(appender.data), 500)
+		self.assertGreater(len(appender.data), 490)
+
+	def test_invalid_modes(self):
+		with self.assertRaises(ValueError):
+			UniqueAppender(by='weakref', window=10)
+		with self.assertRaises(ValueError):
+			UniqueAppender(by='value', window=10, capacity=10)
+		with self.assertRaises(ValueError):
+			UniqueAppender(by='equality')
+
+
+class BloomFilterTest(unittest.TestCase):
+
+	def test_no_false_negatives(self):
+		bloom = BloomFilter(1000, 0.01)
+		added = sum(1 for i in range(1000) if bloom.add('item-%d' % i))
+		self.assertGreater(added, 950)
+		for i in range(1000):
+			self.assertIn('item-%d' % i, bloom)
+			self.assertFalse(bloom.add('item-%d' % i))
+
+	def test_false_positive_rate(self):
+		bloom = BloomFilter(1000, 0.01)
+		for i in range(1000):
+			bloom.add(i)
+		false_positives = sum(1 for i in range(1000, 11000) if i in bloom)
+		self.assertLess(false_positives, 300)
+
+
+class UniqueTest(unittest.TestCase):
+
+	def test_unique_list(self):
+		self.assertEqual([3, 1, 2], unique_list([3, 1, 3, 2, 1]))
+		calls = []
+		def key(x):
+			calls.append(x)
+			return x.lower()
+		self.assertEqual(['a', 'b'], unique_list(iter(['a', 'A', 'b']), key))
+		self.assertEqual(['a', 'A', 'b'], calls)
+
+	def test_iter_unique_is_lazy(self):
+		def stream():
+			yield 'a'
+			yield 'a'
+			yield 'b'
+			raise AssertionError('Read too far.')
+		items = iter_unique(stream())
+		self.assertEqual('a', next(items))
+		self.assertEqual('b', next(items))
+
+	def test_iter_unique_with_key(self):
+		calls = []
+		def key(x):
+			calls.append(x)
+			return x % 3
+		self.assertEqual([0, 1, 2], list(iter_unique(range(9), key)))
+		self.assertEqual(list(range(9)), calls)
+
+	def test_iter_unique_with_maxsize(self):
+		self.assertEqual(['a', 'b', 'c', 'b', 'a'], list(iter_unique('abacba', maxsize=2)))
+
+	def test_iter_unique_with_capacity(self):
+		items = list(iter_unique((i % 100 for i in range(10000)), capacity=1000, error_rate=0.001))
+		self.assertLessEqual(len(items), 100)
+		self.assertGreater(len(items), 95)
+
+
+class ToSequenceTest(unittest.TestCase):
+
+	def test_to_list(self):
+		self.assertEqual([1], to_list(1))
+		self.assertEqual(['abc'], to_list('abc'))
+		self.assertEqual([1, 2], to_list((1, 2)))
+		self.assertEqual('x', to_list(None, 'x'))
+
+	def test_sequences_are_not_copied(self):
+		values = [[1, 2], (1, 2), range(5), array.array('i', [1, 2]), memoryview(b'ab'), b'ab', bytearray(b'ab')]
+		for value in values:
+			self.assertIs(value, to_sequence(value))
+			self.assertIs(value, ensure_iterable(value))
+			self.assertEqual(to_list(value), list(to_sequence(value)))
+
+	def test_scalars_are_wrapped(self):
+		for value in (1, 'abc', 2.5):
+			self.assertEqual([value], to_sequence(value))
+		self.assertEqual('x', to_sequence(None, 'x'))
+
+	def test_iterators(self):
+		gen = (i for i in range(3))
+		self.assertIs(gen, to_sequence(gen, lazy=True))
+		self.assertIs(gen, ensure_iterable(gen))
+		self.assertEqual([0, 1, 2], to_sequence(gen))
+		self.assertEqual([1], to_sequence({1 : 'a'}))
+		self.assertEqual([1], sorted(to_sequence({1})))
+
+	def test_numpy_arrays(self):
+		try:
+			import numpy
+		except ImportError:
+			self.skipTest('NumPy is not installed.')
+		values = numpy.arange(10)
+		self.assertIs(values, to_sequence(values))
+		self.assertIs(values, ensure_iterable(values))
+		scalar = numpy.array(5)
+		self.assertEqual([scalar], to_sequence(scalar))
+
+
+class IndexedStackTest(unittest.TestCase):
+
+	def create(self):
+		Alert = record('Alert', ['code', 'level'])
+		alerts = IndexedStack(hashed=('code',), ordered=('level',))
+		alerts['a'] = Alert('x', 3)
+		alerts['b'] = Alert('y', 1)
+		alerts['c'] = Alert('x', 2)
+		alerts['d'] = Alert('z', 3)
+		return alerts
+
+	def test_find(self):
+		alerts = self.create()
+		self.assertEqual([alerts.a, alerts.c], alerts.find('code', 'x'))
+		self.assertEqual([], alerts.find('code', 'missing'))
+		self.assertEqual([alerts.a, alerts.d], alerts.find('level', 3))
+		self.assertIs(alerts.b, alerts.find_one('code', 'y'))
+		self.assertIsNone(alerts.find_one('code', 'missing'))
+		self.assertEqual(['a', 'b', 'c', 'd'], alerts.keys())
+
+	def test_find_range(self):
+		alerts = self.create()
+		self.assertEqual([alerts.b, alerts.c], alerts.find_range('level', 1, 3))
+		self.assertEqual([alerts.c, alerts.a, alerts.d], alerts.find_range('level', 2))
+		self.assertEqual([alerts.c], alerts.find_range('level', 1, 3, inclusive=(False, False)))
+		self.assertEqual([alerts.b, alerts.c, alerts.a, alerts.d], alerts.find_range('level', high=3, inclusive=(True, True)))
+		self.assertEqual([1, 2, 3], alerts.index_values('level'))
+		with self.assertRaises(KeyError):
+			alerts.find_range('code', 'x')
+
+	def test_delete_and_replace(self):
+		alerts = self.create()
+		del alerts['a']
+		self.assertEqual([alerts.c], alerts.find('code', 'x'))
+		self.assertEqual([alerts.d], alerts.find('level', 3))
+		alerts['c'] = alerts.c.__class__('w', 5)
+		self.assertEqual([], alerts.find('code', 'x'))
+		self.assertEqual(['y', 'z', 'w'], alerts.index_values('code'))
+		self.assertEqual([alerts.d, alerts.c], alerts.find_range('level', 3))
+		self.assertEqual(['b', 'c', 'd'], alerts.keys())
+		alerts.clear()
+		self.assertEqual([], alerts.find('code', 'y'))
+		self.assertEqual([], alerts.find_range('level'))
+
+	def test_replace_keeps_insertion_order(self):
+		items = IndexedStack(hashed=('code',), ordered=('level',))
+		items['a'] = {'code' : 1, 'level' : 1}
+		items['b'] = {'code' : 1, 'level' : 1}
+		items['c'] = {'code' : 2, 'level' : 1}
+		items['a'] = {'code' : 1, 'level' : 1, 'new' : True}
+		self.assertEqual([items['a'], items['b']], items.find('code', 1))
+		self.assertEqual([items['a'], items['b'], items['c']], items.find('level', 1))
+		items['a'] = {'code' : 2, 'level' : 1}
+		self.assertEqual([items['a'], items['c']], items.find('code', 2))
+		items.reindex()
+		self.assertEqual([items['a'], items['c']], items.find('code', 2))
+		self.assertEqual(['a', 'b', 'c'], items.keys())
+
+	def test_failed_set_changes_nothing(self):
+		items = IndexedStack(hashed=('code',), ordered=('level',))
+		items['a'] = {'code' : 1, 'level' : 1}
+		with self.assertRaises(KeyError):
+			items['b'] = {'nocode' : 1}
+		self.assertNotIn('b', items)
+		with self.assertRaises(KeyError):
+			del items['b']
+		with self.assertRaises(TypeError):
+			items['b'] = {'code' : 2, 'level' : None}
+		self.assertNotIn('b', items)
+		self.assertEqual([], items.find('code', 2))
+		items['b'] = {'code' : 2, 'level' : 2}
+		self.assertEqual([items['b']], items.find('code', 2))
+
+		with self.assertRaises(TypeError):
+			items['a'] = {'code' : 3, 'level' : 'high'}
+		self.assertEqual({'code' : 1, 'level' : 1}, items['a'])
+		self.assertEqual([items['a']], items.find('code', 1))
+		self.assertEqual([], items.find('code', 3))
+		self.assertEqual([items['a'], items['b']], items.find_range('level'))
+		with self.assertRaises(TypeError):
+			items['c'] = {'code' : [], 'level' : 3}
+		self.assertEqual(['a', 'b'], items.keys())
+		self.assertEqual([1, 2], sorted(items.index_values('code')))
+
+	def test_reindex_and_mappings(self):
+		items = IndexedStack([('a', {'n' : 1}), ('b', {'n' : 2})],
+			hashed=[('odd', lambda v: v['n'] % 2)], ordered=('n',))
+		self.assertEqual([items['a']], items.find('odd', 1))
+		items['a']['n'] = 4
+		items.reindex('a')
+		self.assertEqual([items['b'], items['a']], items.find_range('n'))
+		self.assertEqual([], items.find('odd', 1))
+		self.assertEqual(['odd', 'n'], items.indexes)
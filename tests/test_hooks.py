@@ -0,0 +1,293 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from tea.hooks import Tasks, Alerts, Fineries, CallbackArgs
+
+
+class TasksTest(unittest.TestCase):
+
+	def test_fire_by_level(self):
+		tasks = Tasks()
+		calls = []
+		tasks.bind('save', lambda **kw: calls.append(('b', kw)), level=2)
+		tasks.bind('save', lambda a: calls.append(('a', a)), 'a', level=1)
+		tasks.bind('save', lambda: calls.append(('c', None)), None, level=3)
+		self.assertEqual(3, tasks.fire('save', a=1, b=2))
+		self.assertEqual([('a', 1), ('b', {'a' : 1, 'b' : 2}), ('c', None)], calls)
+
+	def test_feedback_stops_firing(self):
+		tasks = Tasks()
+		tasks.bind('save', lambda: False, None, level=1)
+		tasks.bind('save', lambda: self.fail('Should not be called.'), None, level=2)
+		self.assertEqual(1, tasks.fire('save'))
+
+	def test_named_levels(self):
+		tasks = Tasks(default_level=5, min_level=0, max_level=20)
+		tasks.levels.high = 10
+		self.assertEqual(10, tasks.get_level('high'))
+		self.assertEqual(5, tasks.get_level('default'))
+		self.assertEqual(20, tasks.get_level(50))
+
+	def test_decorator(self):
+		tasks = Tasks()
+
+		@tasks('save', lock=False)
+		def callback(**kwargs):
+			return kwargs
+
+		self.assertTrue(callable(callback))
+		self.assertEqual(1, tasks.fire('save', a=1))
+
+	def test_missing_hooks_are_not_created_on_fire(self):
+		tasks = Tasks()
+		self.assertEqual(0, tasks.fire('missing'))
+		self.assertNotIn('missing', tasks.hooks)
+		self.assertEqual([], tasks.get_holder('created', 1))
+		self.assertIn('created', tasks.hooks)
+
+
+class AlertsTest(unittest.TestCase):
+
+	def test_fire(self):
+		alerts = Alerts()
+		calls = []
+		alerts.bind('changed', lambda value: calls.append(value), 'value')
+		self.assertEqual(1, alerts.fire('changed', value=5, other=1))
+		self.assertEqual([5], calls)
+
+
+class FineriesTest(unittest.TestCase):
+
+	def test_fire(self):
+		fineries = Fineries()
+		fineries.bind('title', lambda value: value.strip(), None, level=1)
+		fineries.bind('title', lambda value, suffix: value + suffix, 'suffix', level=2)
+		self.assertEqual('a!', fineries.fire('title', ' a ', suffix='!'))
+		self.assertEqual(('a!', 2), fineries.fire('title', ' a ', count_callbacks=True, suffix='!'))
+		self.assertEqual('x', fineries.fire('missing', 'x'))
+
+
+class DispatchTest(unittest.TestCase):
+
+	def test_callbacks_are_cached_until_bind(self):
+		tasks = Tasks()
+		first = lambda: None
+		second = lambda: None
+		tasks.bind('save', second, None, level=2)
+		callbacks = tasks.get_callbacks('save')
+		self.assertIs(callbacks, tasks.get_callbacks('save'))
+		tasks.bind('save', first, None, level=1)
+		self.assertEqual([first, second], [c for c, args in tasks.get_callbacks('save')])
+		self.assertEqual((), tasks.get_callbacks('missing'))
+
+	def test_clear_dispatch(self):
+		tasks = Tasks()
+		tasks.bind('save', lambda: None, None)
+		tasks.get_callbacks('save')
+		tasks.get_holder('save', None).append((lambda: None, CallbackArgs((None,))))
+		self.assertEqual(1, len(tasks.get_callbacks('save')))
+		tasks.clear_dispatch()
+		self.assertEqual(2, len(tasks.get_callbacks('save')))
+
+
+	def test_bind_while_building_is_not_lost(self):
+		class BindingTasks(Tasks):
+			def _dispatch_entries(self, key, holder):
+				entries = super(BindingTasks, self)._dispatch_entries(key, holder)
+				if not calls:
+					self.bind('save', lambda: calls.append('late'), None, level=2)
+				return entries
+
+		calls = []
+		tasks = BindingTasks()
+		tasks.bind('save', lambda: calls.append('first'), None, level=1)
+		self.assertEqual(1, tasks.fire('save'))
+		self.assertEqual(2, tasks.fire('save'))
+		self.assertEqual(2, len(tasks.get_callback_levels('save')))
+
+
+class CallbackArgsTest(unittest.TestCase):
+
+	def test_compile_callback_args(self):
+		tasks = Tasks()
+		data = {'a' : 1, 'b' : 2, 'c' : 3}
+		self.assertIs(data, tasks.compile_callback_args(())(data))
+		self.assertEqual({}, tasks.compile_callback_args((None,))(data))
+		self.assertEqual({'b' : 2}, tasks.compile_callback_args(('b',))(data))
+		self.assertEqual({'a' : 1, 'c' : 3}, tasks.compile_callback_args(('a', 'c'))(data))
+		self.assertEqual({'a' : 1, 'c' : 3}, tasks.build_callback_args(('a', 'c'), data))
+		with self.assertRaises(KeyError):
+			tasks.compile_callback_args(('a', 'd'))(data)
+
+	def test_build_callback_args_with_holder_entries(self):
+		tasks = Tasks()
+		tasks.bind('save', lambda a: None, 'a')
+		tasks.bind('save', lambda a, b, c, d: None, 'a', 'b', 'c', 'd')
+		data = {'a' : 1, 'b' : 2, 'c' : 3, 'd' : 4, 'e' : 5}
+		(first, args), (second, more) = tasks.get_callbacks('save')
+		self.assertEqual(('a',), args)
+		self.assertEqual(('a', 'b', 'c', 'd'), more)
+		self.assertEqual({'a' : 1}, tasks.build_callback_args(args, data))
+		self.assertEqual({'a' : 1, 'b' : 2, 'c' : 3, 'd' : 4}, more.select(data))
+		self.assertEqual({'a' : 1, 'b' : 2, 'c' : 3}, CallbackArgs(('a', 'b', 'c')).select(data))
+		self.assertIs(data, CallbackArgs().select(data))
+
+
+class FireAsyncTest(unittest.TestCase):
+
+	def create(self, calls):
+		tasks = Tasks()
+
+		async def slow(name, delay, feedback=None):
+			calls.append(name + ':start')
+			await asyncio.sleep(delay)
+			calls.append(name + ':end')
+			return feedback
+
+		tasks.bind('save', lambda **kw: slow('a', 0.02), level=1)
+		tasks.bind('save', lambda **kw: slow('b', 0.01, False), level=1)
+		tasks.bind('save', lambda **kw: calls.append('c'), level=2)
+		return tasks
+
+	def test_sequential(self):
+		calls = []
+		tasks = self.create(calls)
+		self.assertEqual(2, asyncio.run(tasks.fire_async('save')))
+		self.assertEqual(['a:start', 'a:end', 'b:start', 'b:end'], calls)
+
+	def test_concurrent(self):
+		calls = []
+		tasks = self.create(calls)
+		self.assertEqual(2, asyncio.run(tasks.fire_async('save', concurrent=True)))
+		self.assertEqual(['a:start', 'b:start', 'b:end', 'a:end'], calls)
+
+	def test_all_levels(self):
+		alerts = Alerts()
+		calls = []
+
+		async def callback(value):
+			calls.append(value)
+
+		alerts.bind('changed', callback, 'value', level=2)
+		alerts.bind('changed', lambda value: calls.append(-value), 'value', level=1)
+		self.assertEqual(2, asyncio.run(alerts.fire_async('changed', value=1)))
+		self.assertEqual(2, asyncio.run(alerts.fire_async('changed', concurrent=True, value=2)))
+		self.assertEqual([-1, 1, -2, 2], calls)
+		self.assertEqual(0, asyncio.run(alerts.fire_async('missing')))
+
+
+class ExecutorTest(unittest.TestCase):
+
+	def setUp(self):
+		self.executor = ThreadPoolExecutor(4)
+		self.tasks = Tasks(executor=self.executor)
+
+	def tearDown(self):
+		self.executor.shutdown()
+
+	def test_futures(self):
+		event = threading.Event()
+		self.tasks.bind('save', lambda value: event.wait(1) and value, 'value', level=0)
+		self.tasks.bind('save', lambda value: value * 2, 'value', level=1)
+		futures = self.tasks.fire_in_executor('save', value=3)
+		self.assertEqual(2, len(futures))
+		self.assertEqual(6, futures[1].result(1))
+		self.assertFalse(futures[0].done())
+		event.set()
+		self.assertEqual(3, futures[0].result(1))
+
+	def test_wait_runs_levels_in_order(self):
+		calls = []
+		self.tasks.bind('save', lambda: calls.append(2) or 2, None, level=2)
+		self.tasks.bind('save', lambda: time.sleep(0.01) or calls.append(1) or 1, None, level=1)
+		self.assertEqual([1, 2], self.tasks.fire_in_executor('save', wait=True))
+		self.assertEqual([1, 2], calls)
+		self.assertEqual([], self.tasks.fire_in_executor('missing', wait=True))
+
+	def test_concurrency_limit(self):
+		lock = threading.Lock()
+		running = [0, 0]
+
+		def callback():
+			with lock:
+				running[0] += 1
+				running[1] = max(running)
+			time.sleep(0.01)
+			with lock:
+				running[0] -= 1
+
+		for i in range(6):
+			self.tasks.bind('save', callback, None)
+		self.tasks.set_concurrency('save', 2)
+		self.tasks.fire_in_executor('save', wait=True)
+		self.assertEqual(2, running[1])
+		self.tasks.set_concurrency('save', None)
+		self.tasks.fire_in_executor('save', wait=True)
+		self.assertGreater(running[1], 2)
+
+	def test_default_executor(self):
+		tasks = Tasks()
+		tasks.bind('save', lambda: 1, None)
+		self.assertEqual([1], tasks.fire_in_executor('save', wait=True))
+		self.assertIsInstance(tasks.executor, ThreadPoolExecutor)
+		tasks.executor.shutdown()
+
+
+class InstrumentationTest(unittest.TestCase):
+
+	def test_disabled_by_default(self):
+		tasks = Tasks()
+		callback = lambda: None
+		tasks.bind('save', callback, None)
+		self.assertIs(callback, tasks.get_callbacks('save')[0][0])
+		self.assertEqual({}, tasks.get_stats())
+
+	def test_stats(self):
+		tasks = Tasks()
+
+		def ok(value):
+			return value
+
+		def fail(value):
+			raise ValueError(value)
+
+		tasks.bind('save', ok, 'value', level=1)
+		tasks.fire('save', value=0)
+		tasks.instrument()
+		for i in range(10):
+			tasks.fire('save', value=i)
+		tasks.bind('save', fail, 'value', level=2)
+		with self.assertRaises(ValueError):
+			tasks.fire('save', value=1)
+
+		stats = tasks.get_stats()['save']
+		self.assertEqual(12, stats['calls'])
+		self.assertEqual(1, stats['errors'])
+		self.assertGreater(stats['total'], 0)
+		self.assertLessEqual(stats['p50'], stats['p99'])
+		callbacks = stats['callbacks']
+		self.assertEqual(11, callbacks[ok.__module__ + '.' + ok.__qualname__]['calls'])
+		failed = callbacks[fail.__module__ + '.' + fail.__qualname__]
+		self.assertEqual((1, 1), (failed['calls'], failed['errors']))
+		self.assertIsInstance(failed['last_error'], ValueError)
+
+		tasks.uninstrument()
+		self.assertIs(ok, tasks.get_callbacks('save')[0][0])
+
+	def test_sink_and_async(self):
+		alerts = Alerts()
+		calls = []
+
+		async def callback():
+			await asyncio.sleep(0.01)
+
+		alerts.bind('changed', callback, None)
+		alerts.instrument(sink=calls.append)
+		asyncio.run(alerts.fire_async('changed'))
+		self.assertEqual(1, len(calls))
+		self.assertEqual('changed', calls[0].hook)
+		self.assertIs(callback, calls[0].callback)
+		self.assertGreaterEqual(calls[0].elapsed, 0.01)
+		self.assertIsNone(calls[0].error)